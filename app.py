@@ -1,15 +1,21 @@
 """PyBlasher CLI app."""
 
+import re
 import time
 from sys import exit
 
 import serial
 
+from boot_monitor import monitor_boot
 from constants import VERSION, CLI_WIDTH
-from flash_firmware import flash_image
+from flash_firmware import dump_memory, flash_image, verify_image
+from history import FlashRecord, get_history
+from session_pool import get_session_pool
 from util import find_cp2102n_ports
 
 SERIAL_PORT = "COM1"
+BOOT_MONITOR = False  # Keep the port open after Go and time the app boot.
+BOOT_BANNER_REGEX = None
 
 
 def __flash_image():
@@ -18,23 +24,88 @@ def __flash_image():
     if len(image_path) < 5 or image_path[-4:] != ".bin":
         image_path += ".bin"
 
-    print(f"2. Opening serial port ({SERIAL_PORT})")
-    with serial.Serial(
-        SERIAL_PORT, 115200, parity=serial.PARITY_EVEN, timeout=1
-    ) as ser:
-        time.sleep(1)  # Wait for NRSTs to clear from serial port establishment
-
-        print(f"3. Beginning firmware flash")
+    record = FlashRecord(SERIAL_PORT, image_path, baud=115200)
+    try:
+        print(f"2. Opening serial port ({SERIAL_PORT})")
+        with get_session_pool().lease(
+            SERIAL_PORT, owner="CLI firmware update"
+        ) as session:
+            ser = session.ser
+            print(f"3. Beginning firmware flash")
 
-        try:
-            flash_image(ser, image_path)
-        except RuntimeError as e:
-            if "Sync failed" in str(e):
-                raise RuntimeError("Ensure BOOT0 is raised, then retry")
+            try:
+                sync = flash_image(
+                    ser,
+                    image_path,
+                    phases=record.phases,
+                    device=record.usb_serial or SERIAL_PORT,
+                    synced=session.synced,
+                )
+                record.retries = sync.retries
+                print(f"\t{sync.summary()}")
+            except RuntimeError as e:
+                if "Sync failed" in str(e):
+                    raise RuntimeError("Ensure BOOT0 is raised, then retry")
+                raise
+            finally:
+                session.synced = False  # Go (or a failure) left it unknown.
+
+            if BOOT_MONITOR:
+                print(f"4. Monitoring boot")
+                report = monitor_boot(
+                    ser, sync.go_acked_at, banner_regex=BOOT_BANNER_REGEX
+                )
+                report.add_phases(record.phases)
+                print(f"\t{report.summary()}")
+                for line in report.capture.decode(
+                    "utf-8", errors="replace"
+                ).splitlines():
+                    print(f"\t| {line}")
+    except Exception as e:
+        record.finish(e)
+        raise
+    else:
+        record.finish()
+    finally:
+        get_history().submit(record)
 
     print("\tFirmware update successful")
 
 
+def __verify_image():
+    print(f"1. Enter a firmware filepath (.bin):")
+    image_path = input("> ")
+    if len(image_path) < 5 or image_path[-4:] != ".bin":
+        image_path += ".bin"
+
+    with get_session_pool().lease(SERIAL_PORT, owner="CLI verify") as session:
+        print(f"2. Entering bootloader ({SERIAL_PORT})")
+        print(f"\t{session.ensure_bootloader().summary()}")
+        print(f"3. Verifying firmware")
+        verify_image(session.ser, image_path)
+
+    print("\tFirmware verify successful")
+
+
+def __dump_memory():
+    print("1. Enter a start address (hex, default 0x08000000):")
+    addr = int(input("> ").strip() or "0x08000000", 16)
+    print("2. Enter a length in bytes:")
+    length = int(input("> ").strip(), 0)
+    print("3. Enter an output filepath:")
+    out_path = input("> ").strip()
+
+    with get_session_pool().lease(SERIAL_PORT, owner="CLI dump") as session:
+        print(f"4. Entering bootloader ({SERIAL_PORT})")
+        print(f"\t{session.ensure_bootloader().summary()}")
+        print(f"5. Reading 0x{addr:08X}-0x{addr + length:08X}")
+        data = dump_memory(session.ser, addr, length)
+
+    with open(out_path, "wb") as f:
+        f.write(data)
+    print(f"\tDumped {len(data)} bytes to {out_path}")
+
+
 def __serial_port_manual_config():
     global SERIAL_PORT
 
@@ -48,6 +119,24 @@ def __serial_port_manual_config():
     print(f"\tSerial port configured to: {SERIAL_PORT}")
 
 
+def __boot_monitor_config():
+    global BOOT_MONITOR, BOOT_BANNER_REGEX
+
+    print(f"Post-flash boot monitor: {'on' if BOOT_MONITOR else 'off'}")
+    print("Enable post-flash boot monitor? (y/n)")
+    BOOT_MONITOR = input("> ").strip().lower().startswith("y")
+    if BOOT_MONITOR:
+        print(f"Current boot banner regex: {BOOT_BANNER_REGEX}")
+        print("Enter a boot banner regex (empty for none):")
+        BOOT_BANNER_REGEX = input("> ").strip() or None
+        if BOOT_BANNER_REGEX:
+            re.compile(BOOT_BANNER_REGEX)  # Raises on an invalid pattern.
+    print(
+        f"\tPost-flash boot monitor {'on' if BOOT_MONITOR else 'off'}"
+        + (f", banner {BOOT_BANNER_REGEX!r}" if BOOT_BANNER_REGEX else "")
+    )
+
+
 def __serial_port_auto_config():
     global SERIAL_PORT
 
@@ -79,6 +168,9 @@ def main_menu_print():
         "     1 = Firmware update\n"
         "     2 = Automatic serial port configuration\n"
         "     3 = Manual serial port configuration\n"
+        "     4 = Post-flash boot monitor configuration\n"
+        "     5 = Firmware verify\n"
+        "     6 = Memory dump\n"
         "     e = Exit\n"
     )
 
@@ -104,6 +196,12 @@ def run_cli():
                     __serial_port_auto_config()
                 elif choice == "3":
                     __serial_port_manual_config()
+                elif choice == "4":
+                    __boot_monitor_config()
+                elif choice == "5":
+                    __verify_image()
+                elif choice == "6":
+                    __dump_memory()
                 elif choice == "e":
                     raise KeyboardInterrupt
                 else:
@@ -116,6 +214,8 @@ def run_cli():
                 print(f"\tFileNotFoundError: {e}")
             except RuntimeError as e:
                 print(f"\tRuntimeError: {e}")
+            except re.error as e:
+                print(f"\tInvalid regex: {e}")
 
             print(f"\tCompleted in {time.time() - start} seconds")
 
@@ -0,0 +1,94 @@
+"""Post-flash boot monitor (time-to-first-byte and boot banner latency)."""
+
+import re
+import time
+
+import serial
+
+from constants import (
+    BOOT_CAPTURE_AFTER_BANNER_S,
+    BOOT_CAPTURE_BYTES,
+    BOOT_MONITOR_TIMEOUT_S,
+)
+
+
+class BootReport:
+    """Boot timings in seconds relative to the Go ACK (None if not seen)."""
+
+    def __init__(self):
+        self.first_byte_s = None
+        self.banner_s = None
+        self.banner = None
+        self.capture = bytearray()
+
+    def summary(self) -> str:
+        def _ms(value):
+            return f"{value * 1000:.1f} ms" if value is not None else "n/a"
+
+        text = (
+            f"Boot: first byte {_ms(self.first_byte_s)}, "
+            f"banner {_ms(self.banner_s)}, "
+            f"captured {len(self.capture)} bytes"
+        )
+        if self.banner:
+            text += f" ({self.banner!r})"
+        return text
+
+    def add_phases(self, phases: dict):
+        """Add the boot timings to a flash phase dict (see flash_image)."""
+        if self.first_byte_s is not None:
+            phases["boot_first_byte"] = self.first_byte_s
+        if self.banner_s is not None:
+            phases["boot_banner"] = self.banner_s
+
+
+def monitor_boot(
+    ser: serial.Serial,
+    start: float | None = None,
+    banner_regex: str | None = None,
+    timeout_s: float = BOOT_MONITOR_TIMEOUT_S,
+    capture_bytes: int = BOOT_CAPTURE_BYTES,
+    baud: int | None = None,
+    parity: str = serial.PARITY_NONE,
+) -> BootReport:
+    """Keep the port open after Go and timestamp the application's output.
+
+    start is the time.perf_counter() value of the Go ACK (go() returns it,
+    flash_image() as SyncResult.go_acked_at; defaults to now).
+    The port is switched from the bootloader's 8E1 to the application's
+    framing first. Monitoring ends when capture_bytes have been captured,
+    BOOT_CAPTURE_AFTER_BANNER_S after the banner, or at timeout_s.
+    """
+    if start is None:
+        start = time.perf_counter()
+    ser.parity = parity
+    if baud:
+        ser.baudrate = baud
+    ser.timeout = 0.01
+
+    banner = re.compile(banner_regex.encode()) if banner_regex else None
+    report = BootReport()
+    deadline = start + timeout_s
+
+    while (
+        time.perf_counter() < deadline and len(report.capture) < capture_bytes
+    ):
+        n = ser.in_waiting
+        data = ser.read(min(n if n else 1, capture_bytes - len(report.capture)))
+        if not data:
+            continue
+        now = time.perf_counter() - start
+        if report.first_byte_s is None:
+            report.first_byte_s = now
+        report.capture.extend(data)
+
+        if banner and report.banner_s is None:
+            match = banner.search(report.capture)
+            if match:
+                report.banner_s = now
+                report.banner = match.group(0).decode("utf-8", "replace")
+                deadline = min(
+                    deadline, time.perf_counter() + BOOT_CAPTURE_AFTER_BANNER_S
+                )
+
+    return report
@@ -0,0 +1,302 @@
+"""Software STM32 UART bootloader stand-in (serial port look-alike).
+
+Emulates the subset of the AN3155 protocol PyBlasher uses (auto-baud sync,
+Get, Extended Erase, Write Memory, Read Memory, Go) behind the parts of the
+serial.Serial interface the flashing code touches, so the flash paths,
+session pool and flash server can be exercised without hardware. Ports
+named "sim://<name>" are opened through open_simulated_port().
+"""
+
+import time
+from threading import Condition
+
+import serial
+
+from constants import (
+    SIM_APP_BANNER,
+    SIM_BOOT_MS,
+    SIM_FLASH_BASE,
+    SIM_FLASH_SIZE,
+    SIM_PAGE_ERASE_MS,
+    SIM_PAGE_SIZE,
+)
+from flash_firmware import ACK, NACK, checksum
+
+SIM_PREFIX = "sim://"
+SIM_VERSION = 0x31  # AN3155 protocol version 3.1.
+SIM_COMMANDS = bytes([0x00, 0x11, 0x21, 0x31, 0x44])
+
+
+def is_simulated(port: str) -> bool:
+    return port.startswith(SIM_PREFIX)
+
+
+class SimulatedBootloader:
+    """Serial-like object backed by an emulated STM32 bootloader."""
+
+    def __init__(
+        self,
+        port: str,
+        flash_base: int = SIM_FLASH_BASE,
+        flash_size: int = SIM_FLASH_SIZE,
+        page_size: int = SIM_PAGE_SIZE,
+        boot_ms: float = SIM_BOOT_MS,
+        page_erase_ms: float = SIM_PAGE_ERASE_MS,
+        banner: bytes = SIM_APP_BANNER,
+        sync_ack_ms: float = 0,
+    ):
+        self.port = port
+        self.flash_base = flash_base
+        self.page_size = page_size
+        self.flash = bytearray(b"\xff" * flash_size)
+        self.boot_ms = boot_ms
+        self.page_erase_ms = page_erase_ms
+        self.banner = banner
+        self.sync_ack_ms = sync_ack_ms  # Late sync ACK (host/USB jitter).
+
+        self.baudrate = 115200
+        self.parity = serial.PARITY_EVEN
+        self.timeout = 1
+        self.write_timeout = None
+        self.is_open = True
+        self.dtr = False
+
+        self.mode = "app"  # "reset", "boot", "sync" (auto-baud) or "cmd".
+        self.go_addr = None
+        self._rts = True
+        self._released = 0.0
+        self._rx = bytearray()  # Device -> host.
+        self._scheduled = []  # (due perf_counter, bytes) device output.
+        self._cond = Condition()
+        self._protocol = None
+
+    # serial.Serial look-alike ------------------------------------------
+
+    @property
+    def rts(self) -> bool:
+        return self._rts
+
+    @rts.setter
+    def rts(self, value: bool):
+        with self._cond:
+            if not value:
+                self.mode = "reset"  # NRST asserted (low).
+            elif not self._rts:
+                self.mode = "boot"
+                self._released = time.perf_counter()
+                self._scheduled.clear()
+            self._rts = value
+
+    @property
+    def in_waiting(self) -> int:
+        with self._cond:
+            self._deliver_due()
+            return len(self._rx)
+
+    def write(self, data: bytes) -> int:
+        with self._cond:
+            for byte in data:
+                self._on_byte(byte)
+            self._cond.notify_all()
+        return len(data)
+
+    def read(self, size: int = 1) -> bytes:
+        deadline = (
+            None if self.timeout is None else time.perf_counter() + self.timeout
+        )
+        with self._cond:
+            while True:
+                self._deliver_due()
+                if len(self._rx) >= size:
+                    break
+                now = time.perf_counter()
+                if deadline is not None and now >= deadline:
+                    break
+                wait = 0.05 if deadline is None else deadline - now
+                if self._scheduled:
+                    wait = min(wait, max(0.0, self._scheduled[0][0] - now))
+                self._cond.wait(wait)
+            data = bytes(self._rx[:size])
+            del self._rx[:size]
+            return data
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        with self._cond:
+            self._deliver_due()
+            self._rx.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+    # Device side --------------------------------------------------------
+
+    def _deliver_due(self):
+        now = time.perf_counter()
+        while self._scheduled and self._scheduled[0][0] <= now:
+            self._rx.extend(self._scheduled.pop(0)[1])
+
+    def _reply(self, data: bytes, delay_ms: float = 0):
+        """Queue device output; replies keep their order like on a wire."""
+        if not delay_ms and not self._scheduled:
+            self._rx.extend(data)
+            return
+        due = time.perf_counter() + delay_ms / 1000
+        if self._scheduled:
+            due = max(due, self._scheduled[-1][0])
+        self._scheduled.append((due, data))
+
+    def _on_byte(self, byte: int):
+        if self.mode == "boot":
+            if (time.perf_counter() - self._released) * 1000 < self.boot_ms:
+                return  # Still in reset/startup, the byte is lost.
+            self.mode = "sync"
+        if self.mode == "sync":
+            if byte == 0x7F:
+                self.mode = "cmd"
+                self._protocol = self._commands()
+                next(self._protocol)
+                self._reply(ACK, self.sync_ack_ms)
+            return
+        if self.mode == "cmd":
+            self._protocol.send(byte)
+
+    def _read(self, n: int):
+        data = bytearray()
+        while len(data) < n:
+            data.append((yield))
+        return bytes(data)
+
+    def _read_addr(self):
+        raw = yield from self._read(5)
+        if checksum(raw[:4]) != raw[4]:
+            return None
+        return int.from_bytes(raw[:4], "big")
+
+    def _offset(self, addr: int, length: int) -> int | None:
+        offset = addr - self.flash_base
+        if offset < 0 or offset + length > len(self.flash):
+            return None
+        return offset
+
+    def _commands(self):
+        """Command interpreter, fed one host byte per send()."""
+        while True:
+            # A stray 0x7F is the first byte of a command too, only the
+            # following (non complement) byte gets it NACKed.
+            cmd = yield
+            complement = yield
+            if cmd ^ complement != 0xFF:
+                self._reply(NACK)
+                continue
+
+            if cmd == 0x00:  # Get
+                self._reply(
+                    ACK
+                    + bytes([len(SIM_COMMANDS), SIM_VERSION])
+                    + SIM_COMMANDS
+                    + ACK
+                )
+
+            elif cmd == 0x44:  # Extended Erase
+                self._reply(ACK)
+                count = yield from self._read(2)
+                n = int.from_bytes(count, "big")
+                if n == 0xFFFF:
+                    cs = yield
+                    if cs != checksum(count):
+                        self._reply(NACK)
+                        continue
+                    self.flash[:] = b"\xff" * len(self.flash)
+                    self._reply(ACK)
+                    continue
+                pages = yield from self._read(2 * (n + 1))
+                cs = yield
+                if cs != checksum(count + pages):
+                    self._reply(NACK)
+                    continue
+                numbers = [
+                    int.from_bytes(pages[i : i + 2], "big")
+                    for i in range(0, len(pages), 2)
+                ]
+                if any(
+                    (p + 1) * self.page_size > len(self.flash) for p in numbers
+                ):
+                    self._reply(NACK)
+                    continue
+                for p in numbers:
+                    start = p * self.page_size
+                    self.flash[start : start + self.page_size] = (
+                        b"\xff" * self.page_size
+                    )
+                # ACK once every page would have been erased.
+                self._reply(ACK, len(numbers) * self.page_erase_ms)
+
+            elif cmd == 0x31:  # Write Memory
+                self._reply(ACK)
+                addr = yield from self._read_addr()
+                if addr is None:
+                    self._reply(NACK)
+                    continue
+                self._reply(ACK)
+                n = yield
+                data = yield from self._read(n + 1)
+                cs = yield
+                offset = self._offset(addr, len(data))
+                if (
+                    cs != checksum(bytes([n]) + data)
+                    or offset is None
+                    or any(
+                        b != 0xFF
+                        for b in self.flash[offset : offset + len(data)]
+                    )
+                ):
+                    self._reply(NACK)  # Bad checksum/address or not erased.
+                    continue
+                self.flash[offset : offset + len(data)] = data
+                self._reply(ACK)
+
+            elif cmd == 0x11:  # Read Memory
+                self._reply(ACK)
+                addr = yield from self._read_addr()
+                if addr is None:
+                    self._reply(NACK)
+                    continue
+                self._reply(ACK)
+                n, n_complement = yield from self._read(2)
+                offset = self._offset(addr, n + 1)
+                if n ^ n_complement != 0xFF or offset is None:
+                    self._reply(NACK)
+                    continue
+                self._reply(ACK + bytes(self.flash[offset : offset + n + 1]))
+
+            elif cmd == 0x21:  # Go
+                self._reply(ACK)
+                addr = yield from self._read_addr()
+                if addr is None or self._offset(addr, 4) is None:
+                    self._reply(NACK)
+                    continue
+                self._reply(ACK)
+                self.mode = "app"
+                self.go_addr = addr
+                self._reply(self.banner, self.boot_ms)
+
+            else:
+                self._reply(NACK)
+
+
+_devices = {}
+
+
+def open_simulated_port(port: str) -> SimulatedBootloader:
+    """Open a "sim://<name>" port; flash contents persist per name."""
+    device = _devices.get(port)
+    if device is None:
+        device = _devices[port] = SimulatedBootloader(port)
+    device.is_open = True
+    return device
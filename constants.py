@@ -1,5 +1,7 @@
 """PyBlasher constants."""
 
+import os.path
+
 # PyBlasher version.
 VERSION = "0.2.2"
 
@@ -9,3 +11,80 @@ CLI_WIDTH = 80
 # Silicon Labs CP2102N default USB VID/PID.
 CP2102N_VID = 0x10C4
 CP2102N_PID = 0xEA60
+
+# Multi-port monitor: lines kept per port, poll interval for ports without fd.
+MONITOR_RING_LINES = 10000
+MONITOR_POLL_INTERVAL_S = 0.01
+
+# Flash session history database and writer batching.
+HISTORY_DB_PATH = os.path.join(
+    os.path.expanduser("~"), ".pyblasher", "history.db"
+)
+HISTORY_BATCH_SIZE = 64
+HISTORY_FLUSH_INTERVAL_S = 1.0
+
+# Post-flash boot monitor defaults.
+BOOT_MONITOR_TIMEOUT_S = 5.0
+BOOT_CAPTURE_BYTES = 4096
+BOOT_CAPTURE_AFTER_BANNER_S = 0.5
+
+# GUI profiler frame work budget (60 FPS) and callbacks listed in the report.
+PROFILE_FRAME_BUDGET_MS = 1000 / 60
+PROFILE_TOP_CALLBACKS = 10
+
+# Adaptive reset/sync: default NRST hold and settle delay before the first
+# sync byte, per-success shrink factor while learning, sync byte poll
+# interval and deadline per reset, reset cycles, settle fraction of the ACK
+# time when polling started too early with no known-good settle yet.
+SYNC_HOLD_MS = 20
+SYNC_MIN_HOLD_MS = 2
+SYNC_SETTLE_MS = 50
+SYNC_LEARN_FACTOR = 0.75
+SYNC_POLL_INTERVAL_S = 0.01
+SYNC_DEADLINE_S = 1.0
+# Headroom over the USB round trip for late sync replies (drain and flush).
+SYNC_DRAIN_S = 0.05
+SYNC_RESETS = 2
+SYNC_SETTLE_FRACTION = 0.8
+SYNC_TIMINGS_PATH = os.path.join(
+    os.path.expanduser("~"), ".pyblasher", "sync_timings.json"
+)
+
+# Serial session pool: health check period, how long a lease waits out a
+# running health check (a bootloader probe is ~200 ms), idle close timeout.
+POOL_HEALTH_INTERVAL_S = 5.0
+POOL_HEALTH_WAIT_S = 1.0
+POOL_IDLE_TIMEOUT_S = 300.0
+POOL_WRITE_TIMEOUT_S = 0.5
+
+# Software bootloader stand-in: flash geometry, reset-to-ready time, page
+# erase time and the banner its "application" prints after Go.
+SIM_FLASH_BASE = 0x08000000
+SIM_FLASH_SIZE = 512 * 1024
+SIM_PAGE_SIZE = 2048
+SIM_BOOT_MS = 15
+SIM_PAGE_ERASE_MS = 20
+SIM_APP_BANNER = b"PyBlasher simulated app ready\r\n"
+
+# Flash server: uploaded image store, upload limit, progress event step and
+# CP2102N port rescan period.
+SERVER_IMAGE_DIR = os.path.join(os.path.expanduser("~"), ".pyblasher", "images")
+SERVER_MAX_IMAGE_BYTES = 16 * 1024 * 1024
+SERVER_PROGRESS_BYTES = 4096
+SERVER_RESCAN_INTERVAL_S = 5.0
+
+# Terminal log search result limit.
+SEARCH_MAX_RESULTS = 1000
+
+# TX -> RX latency profiler response timeout and histogram bins.
+LATENCY_TIMEOUT_S = 1.0
+LATENCY_HISTOGRAM_BINS = 10
+
+# Default flash geometry for manifests without a "flash" section, the page
+# count per Extended Erase command and the worst case erase time per page
+# (the erase ACK timeout scales with the chunk size).
+FLASH_BASE = 0x08000000
+FLASH_SIZE = 512 * 1024
+FLASH_PAGE_SIZE = 2048
+ERASE_PAGES_PER_COMMAND = 64
+ERASE_PAGE_TIMEOUT_S = 0.05
@@ -1,17 +1,50 @@
 """STM32 programmer prototype (USB to UART bootloader)."""
 
+import json
+import os
 import time
+from contextlib import contextmanager
 from functools import reduce
 from operator import xor
+from threading import Lock
 
 import serial
 
+from constants import (
+    ERASE_PAGE_TIMEOUT_S,
+    ERASE_PAGES_PER_COMMAND,
+    SYNC_DEADLINE_S,
+    SYNC_DRAIN_S,
+    SYNC_HOLD_MS,
+    SYNC_LEARN_FACTOR,
+    SYNC_MIN_HOLD_MS,
+    SYNC_POLL_INTERVAL_S,
+    SYNC_RESETS,
+    SYNC_SETTLE_FRACTION,
+    SYNC_SETTLE_MS,
+    SYNC_TIMINGS_PATH,
+)
+
+ACK = b"\x79"
+NACK = b"\x1f"
+
 
 def checksum(data: bytes) -> int:
     """Compute XOR checksum over the data bytes."""
     return reduce(xor, data, 0)
 
 
+@contextmanager
+def timed_phase(phases: dict | None, name: str):
+    """Record the wall time of a block into phases[name] (seconds)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if phases is not None:
+            phases[name] = time.perf_counter() - start
+
+
 def pulse_nrst(ser: serial.Serial, duration_ms: int = 50):
     """Hold NRST low for duration_ms, then release.
 
@@ -22,15 +55,269 @@ def pulse_nrst(ser: serial.Serial, duration_ms: int = 50):
     ser.rts = True  # NRST released (high)
 
 
-def enter_bootloader(ser: serial.Serial):
-    """Pulse NRST to exit reset into bootloader, then perform auto-baud sync."""
-    pulse_nrst(ser, duration_ms=20)  # longer hold for reliability
-    time.sleep(0.05)  # small delay to pass rebounce and allow MCU to reset
-    # Auto-baud sync
-    ser.write(b"\x7f")
-    ack = ser.read(1)
-    if ack != b"\x79":
-        raise RuntimeError(f"Sync failed, expected 0x79, got {ack!r}")
+class SyncTimings:
+    """Learned per-device reset/sync delays, persisted as JSON.
+
+    Each device (USB serial number or port) starts from SYNC_HOLD_MS and
+    SYNC_SETTLE_MS and learns downwards: every success records the delays
+    used as known-good and shrinks them by SYNC_LEARN_FACTOR for the next
+    run. Once a shorter delay is shown to be too short, it locks at its
+    known-good value:
+
+    - hold: the sync failed, back off to the last known-good hold/settle.
+    - settle: the ACK came well after polling started (the bootloader was
+      not ready for the first sync byte), keep the last settle whose first
+      sync byte was ACKed.
+
+    If the known-good delays themselves fail, the device is forgotten and
+    starts over from the defaults.
+    """
+
+    def __init__(self, path: str = SYNC_TIMINGS_PATH):
+        self.path = path
+        self._lock = Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._devices = json.load(f)
+        except (OSError, ValueError):
+            self._devices = {}
+
+    def get(self, device: str | None) -> tuple[float, float]:
+        """Return (hold_ms, settle_ms) for a device."""
+        with self._lock:
+            entry = self._devices.get(device) if device else None
+        if not entry:
+            return SYNC_HOLD_MS, SYNC_SETTLE_MS
+        return entry["hold_ms"], entry["settle_ms"]
+
+    def learn(
+        self,
+        device: str | None,
+        hold_ms: float,
+        settle_ms: float,
+        ack_ms: float,
+        attempts: int = 1,
+    ):
+        """Record a sync ACKed ack_ms after NRST release, on the given
+        sync byte of that reset."""
+        if not device:
+            return
+        with self._lock:
+            entry = dict(self._devices.get(device, {}))
+            entry["good_hold_ms"] = hold_ms
+            if not entry.get("hold_locked"):
+                hold_ms = max(SYNC_MIN_HOLD_MS, hold_ms * SYNC_LEARN_FACTOR)
+
+            if attempts > 1:
+                # Polled before the bootloader was ready.
+                if "good_settle_ms" in entry:
+                    entry["settle_locked"] = True
+                    settle_ms = entry["good_settle_ms"]
+                else:
+                    settle_ms = ack_ms * SYNC_SETTLE_FRACTION
+            else:
+                entry["good_settle_ms"] = settle_ms
+                if not entry.get("settle_locked"):
+                    settle_ms *= SYNC_LEARN_FACTOR
+
+            entry["hold_ms"] = hold_ms
+            entry["settle_ms"] = settle_ms
+            entry["ack_ms"] = min(ack_ms, entry.get("ack_ms", ack_ms))
+            self._devices[device] = entry
+            self._save()
+
+    def fail(self, device: str | None, hold_ms: float, settle_ms: float):
+        """Back off after a sync failure with these delays."""
+        with self._lock:
+            entry = self._devices.get(device) if device else None
+            if not entry:
+                return
+            good = (
+                entry.get("good_hold_ms", SYNC_HOLD_MS),
+                entry.get("good_settle_ms", SYNC_SETTLE_MS),
+            )
+            if (hold_ms, settle_ms) == good:
+                del self._devices[device]  # Known-good failed, start over.
+            else:
+                entry["hold_ms"], entry["settle_ms"] = good
+                entry["hold_locked"] = True
+            self._save()
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self._devices, f, indent=2)
+        except OSError:
+            pass  # Learning is an optimisation, never fail a flash on it.
+
+
+_sync_timings = None
+
+
+def get_sync_timings() -> SyncTimings:
+    global _sync_timings
+    if _sync_timings is None:
+        _sync_timings = SyncTimings()
+    return _sync_timings
+
+
+class SyncResult:
+    """Outcome of reset_and_sync, plus the Go ACK time from flash_image."""
+
+    def __init__(self):
+        self.resets = 0  # NRST pulses issued.
+        self.attempts = 0  # 0x7F sync bytes sent.
+        self.time_to_bootloader_s = None  # First NRST pulse to ACK.
+        self.go_acked_at = None  # time.perf_counter() of the Go ACK.
+
+    @property
+    def retries(self) -> int:
+        return max(0, self.resets - 1)
+
+    def summary(self) -> str:
+        return (
+            f"Bootloader ready in {self.time_to_bootloader_s * 1000:.1f} ms "
+            f"({self.attempts} sync attempt(s), {self.resets} reset(s))"
+        )
+
+
+def reset_and_sync(
+    ser: serial.Serial,
+    device: str | None = None,
+    timings: SyncTimings | None = None,
+) -> SyncResult:
+    """Pulse NRST and poll the 0x7F auto-baud sync until ACK or deadline.
+
+    Replaces fixed post-reset sleeps: sync bytes are sent every
+    SYNC_POLL_INTERVAL_S from the learned settle delay onwards, and the
+    delays that worked are learned per device (see SyncTimings). A NACK
+    means an earlier sync byte already locked the baud rate, so it counts
+    as success. A reply can also belong to an earlier sync byte (a late
+    ACK), and the bootloader takes every 0x7F after the one it synced on
+    as command bytes: a NACK only leaves it clean after an even number of
+    extra bytes, an odd one waits for its complement. So whenever more
+    than one sync byte was sent, the command parser is flushed and checked
+    (see _flush_sync) before the sync counts. Up to SYNC_RESETS reset
+    cycles are tried, backing off to the last known-good delays after a
+    failure.
+    """
+    if timings is None:
+        timings = get_sync_timings()
+    result = SyncResult()
+    timeout = ser.timeout
+    ser.timeout = SYNC_POLL_INTERVAL_S
+    start = time.perf_counter()
+    last = None
+    try:
+        for _ in range(SYNC_RESETS):
+            hold_ms, settle_ms = timings.get(device)
+            result.resets += 1
+            pulse_nrst(ser, duration_ms=hold_ms)
+            released = time.perf_counter()
+            ser.reset_input_buffer()
+            if settle_ms:
+                time.sleep(settle_ms / 1000.0)
+
+            deadline = released + SYNC_DEADLINE_S
+            attempts = 0
+            while time.perf_counter() < deadline:
+                attempts += 1
+                result.attempts += 1
+                ser.write(b"\x7f")
+                last = ser.read(1)
+                if last in (ACK, NACK):
+                    now = time.perf_counter()
+                    if attempts > 1 and not _flush_sync(ser):
+                        break  # Synced, but the command state is unknown.
+                    result.time_to_bootloader_s = time.perf_counter() - start
+                    timings.learn(
+                        device,
+                        hold_ms,
+                        settle_ms,
+                        (now - released) * 1000,
+                        attempts,
+                    )
+                    # Drop late replies to earlier sync bytes.
+                    time.sleep(SYNC_POLL_INTERVAL_S)
+                    ser.reset_input_buffer()
+                    return result
+            else:
+                timings.fail(device, hold_ms, settle_ms)
+    finally:
+        ser.timeout = timeout
+
+    if last in (ACK, NACK):
+        raise RuntimeError(
+            "Sync failed, the bootloader answered but did not recover from "
+            f"stray sync bytes after {result.attempts} attempt(s)"
+        )
+    raise RuntimeError(
+        f"Sync failed, expected 0x79, got {last!r} "
+        f"after {result.attempts} attempt(s)"
+    )
+
+
+def _flush_sync(ser: serial.Serial) -> bool:
+    """Leave no half command pending after several sync bytes were sent.
+
+    Late replies are drained first (SYNC_DRAIN_S). A pending stray 0x7F is
+    completed by another 0x7F and NACKed; with nothing pending that 0x7F
+    becomes pending itself (no reply) and a second one gets the NACK.
+    Returns True once a Get command confirms the bootloader answers.
+    """
+    timeout = ser.timeout
+    ser.timeout = SYNC_DRAIN_S
+    try:
+        time.sleep(SYNC_DRAIN_S)
+        ser.reset_input_buffer()
+        for _ in range(2):
+            ser.write(b"\x7f")
+            if ser.read(1) == NACK:
+                return probe_bootloader(ser)
+        return False
+    finally:
+        ser.timeout = timeout
+
+
+def probe_bootloader(ser: serial.Serial) -> bool:
+    """Check that a previously synced bootloader still answers.
+
+    Sends a complete Get command (0x00 0xFF) and drains its reply, so the
+    bootloader is never left waiting for the rest of a command. No or a
+    malformed reply (application running, reset into auto-baud) means a
+    full reset and sync is needed.
+    """
+    timeout = ser.timeout
+    ser.timeout = SYNC_POLL_INTERVAL_S * 5
+    try:
+        ser.reset_input_buffer()
+        ser.write(bytes([0x00, 0xFF]))
+        if ser.read(1) != ACK:
+            return False
+        n = ser.read(1)
+        if not n:
+            return False
+        # Bootloader version + n command codes, then ACK.
+        body = ser.read(n[0] + 1)
+        return len(body) == n[0] + 1 and ser.read(1) == ACK
+    finally:
+        ser.reset_input_buffer()
+        ser.timeout = timeout
+
+
+def ensure_synced(
+    ser: serial.Serial, device: str | None = None, synced: bool = False
+) -> SyncResult:
+    """Reuse a bootloader session known to be synced, else reset and sync."""
+    if synced:
+        start = time.perf_counter()
+        if probe_bootloader(ser):
+            result = SyncResult()
+            result.attempts = 1
+            result.time_to_bootloader_s = time.perf_counter() - start
+            return result
+    return reset_and_sync(ser, device)
 
 
 def mass_erase(ser: serial.Serial):
@@ -46,6 +333,35 @@ def mass_erase(ser: serial.Serial):
         raise RuntimeError("Global Erase not ACKed")
 
 
+def erase_pages(ser: serial.Serial, pages: list[int]):
+    """Erase specific flash pages using the Extended Erase command.
+
+    The ACK only comes once every page of a command is erased, so the read
+    timeout is raised to ERASE_PAGE_TIMEOUT_S per page while waiting.
+    """
+    timeout = ser.timeout
+    try:
+        for start in range(0, len(pages), ERASE_PAGES_PER_COMMAND):
+            chunk = pages[start : start + ERASE_PAGES_PER_COMMAND]
+            ser.timeout = timeout
+            ser.write(bytes([0x44, 0xBB]))  # 0x44 ^ 0xFF = 0xBB
+            if ser.read(1) != b"\x79":
+                raise RuntimeError("Extended Erase command not ACKed")
+            # N-1 pages (16-bit BE), page numbers (16-bit BE), checksum
+            data = (len(chunk) - 1).to_bytes(2, "big") + b"".join(
+                page.to_bytes(2, "big") for page in chunk
+            )
+            ser.write(data + bytes([checksum(data)]))
+            if timeout is not None:
+                ser.timeout = max(timeout, len(chunk) * ERASE_PAGE_TIMEOUT_S)
+            if ser.read(1) != b"\x79":
+                raise RuntimeError(
+                    f"Page erase not ACKed (pages {chunk[0]}-{chunk[-1]})"
+                )
+    finally:
+        ser.timeout = timeout
+
+
 def write_block(ser: serial.Serial, addr: int, data: bytes):
     """Write a block of data to the given address."""
     # Write Memory command (0x31)
@@ -67,37 +383,117 @@ def write_block(ser: serial.Serial, addr: int, data: bytes):
         raise RuntimeError("Data block not ACKed")
 
 
-def go(ser: serial.Serial, addr: int):
-    """Send the Go command to start execution at addr."""
-    ser.write(bytes([0x21, 0xDE]))  # 0x21 ^ 0xFF = 0xDE
+def read_memory(ser: serial.Serial, addr: int, length: int) -> bytes:
+    """Read up to 256 bytes starting at the given address."""
+    if not 0 < length <= 256:
+        raise ValueError("Block too large")
+    # Read Memory command (0x11)
+    ser.write(bytes([0x11, 0xEE]))  # 0x11 ^ 0xFF = 0xEE
     if ser.read(1) != b"\x79":
-        raise RuntimeError("Go command not ACKed")
+        raise RuntimeError("Read Memory command not ACKed")
     addr_bytes = addr.to_bytes(4, "big")
     ser.write(addr_bytes + bytes([checksum(addr_bytes)]))
     if ser.read(1) != b"\x79":
-        raise RuntimeError("Go address not ACKed")
+        raise RuntimeError("Address not ACKed")
+    ser.write(bytes([length - 1, (length - 1) ^ 0xFF]))
+    if ser.read(1) != b"\x79":
+        raise RuntimeError("Read length not ACKed")
+    data = ser.read(length)
+    if len(data) != length:
+        raise RuntimeError(f"Short read, expected {length}, got {len(data)}")
+    return data
 
 
-def flash_image(
+def dump_memory(ser: serial.Serial, addr: int, length: int) -> bytes:
+    """Read an arbitrary length memory region in 256-byte blocks."""
+    data = bytearray()
+    for offset in range(0, length, 256):
+        data += read_memory(ser, addr + offset, min(256, length - offset))
+    return bytes(data)
+
+
+def verify_image(
     ser: serial.Serial, image_path: str, base_addr: int = 0x08000000
 ):
-    """Overall flow: enter bootloader, erase, program, and reset into app."""
+    """Read back flash and compare it with the image file."""
     img = open(image_path, "rb").read()
+    for offset in range(0, len(img), 256):
+        chunk = img[offset : offset + 256]
+        if read_memory(ser, base_addr + offset, len(chunk)) != chunk:
+            raise RuntimeError(
+                f"Verify failed in block at 0x{base_addr + offset:08X}"
+            )
 
-    # 1) Pulse NRST before start
-    pulse_nrst(ser, duration_ms=50)
-    time.sleep(0.05)
 
-    # 2) Enter bootloader via NRST pulse + sync
-    enter_bootloader(ser)
+def go(ser: serial.Serial, addr: int) -> float:
+    """Send the Go command to start execution at addr.
+
+    Returns the time.perf_counter() value of the address ACK, i.e. when the
+    application starts (the boot monitor's reference point).
+    """
+    ser.write(bytes([0x21, 0xDE]))  # 0x21 ^ 0xFF = 0xDE
+    if ser.read(1) != b"\x79":
+        raise RuntimeError("Go command not ACKed")
+    addr_bytes = addr.to_bytes(4, "big")
+    ser.write(addr_bytes + bytes([checksum(addr_bytes)]))
+    if ser.read(1) != b"\x79":
+        raise RuntimeError("Go address not ACKed")
+    return time.perf_counter()
 
-    # 3) Mass erase flash
-    mass_erase(ser)
 
-    # 4) Program in 256-byte pages
+def write_image(ser: serial.Serial, img: bytes, base_addr: int, on_block=None):
+    """Program an image in 256-byte blocks, on_block(done_bytes) after each."""
     for offset in range(0, len(img), 256):
         chunk = img[offset : offset + 256]
         write_block(ser, base_addr + offset, chunk)
+        if on_block:
+            on_block(offset + len(chunk))
+
+
+def flash_image(
+    ser: serial.Serial,
+    image_path: str,
+    base_addr: int = 0x08000000,
+    phases: dict | None = None,
+    device: str | None = None,
+    synced: bool = False,
+    progress=None,
+) -> SyncResult:
+    """Overall flow: enter bootloader, erase, program, and reset into app.
+
+    If phases is given, it is filled with per-phase durations in seconds
+    (also for the phases completed before a failure). device keys the
+    learned reset/sync delays (USB serial number or port). synced skips
+    the reset when the bootloader session is still synced (see
+    ensure_synced). progress(phase, done, total) is called as each phase
+    starts and after every written block (done/total in image bytes).
+    The returned SyncResult carries the Go ACK time (go_acked_at).
+    """
+    img = open(image_path, "rb").read()
+    total = len(img)
+
+    def _progress(phase: str, done: int = 0):
+        if progress:
+            progress(phase, done, total)
+
+    # 1) Enter bootloader via NRST pulse + adaptive sync
+    _progress("sync")
+    with timed_phase(phases, "sync"):
+        sync = ensure_synced(ser, device, synced)
+
+    # 2) Mass erase flash
+    _progress("erase")
+    with timed_phase(phases, "erase"):
+        mass_erase(ser)
+
+    # 3) Program in 256-byte pages
+    _progress("write")
+    with timed_phase(phases, "write"):
+        write_image(ser, img, base_addr, lambda done: _progress("write", done))
+
+    # 4) Issue 'Go' to start application
+    _progress("go", total)
+    with timed_phase(phases, "go"):
+        sync.go_acked_at = go(ser, base_addr)
 
-    # 5) Issue 'Go' to start application
-    go(ser, base_addr)
+    return sync
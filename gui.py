@@ -1,5 +1,6 @@
 """PyBlasher GUI app."""
 
+import re
 import time
 from threading import Thread
 
@@ -16,14 +17,21 @@ from kivy.uix.popup import Popup
 from kivy.uix.screenmanager import ScreenManager, Screen
 from kivy.uix.spinner import Spinner
 from kivy.uix.textinput import TextInput
+from kivy.uix.togglebutton import ToggleButton
 from kivy.uix.widget import Widget
 
-from constants import VERSION
+from boot_monitor import monitor_boot
+from constants import SEARCH_MAX_RESULTS, VERSION
 from flash_firmware import flash_image
+from history import FlashRecord, get_history
+from latency import LatencyProbe, measure, report as latency_report
+from log_index import LEVELS, LogIndex, parse_time_of_day
+from monitor import get_serial_monitor
+from session_pool import get_session_pool
 from util import (
     resource_path,
     find_cp2102n_ports,
-    open_serial_port,
+    format_timestamp,
     write_serial_bytes,
     parse_hex,
 )
@@ -87,6 +95,25 @@ class FirmwareToolUI(BoxLayout):
         self.bin_path = None
         Window.bind(on_drop_file=self._on_file_drop)
 
+        # Post-flash boot monitor
+        boot_row = BoxLayout(
+            orientation="horizontal", size_hint=(1, 0.25), spacing=10
+        )
+        self.boot_btn = ToggleButton(
+            text="Boot monitor",
+            size_hint=(0.35, 1),
+            font_size=sp(16),
+        )
+        boot_row.add_widget(self.boot_btn)
+        self.boot_banner_input = TextInput(
+            hint_text="Boot banner regex (optional)",
+            multiline=False,
+            size_hint=(0.65, 1),
+            font_size=sp(16),
+        )
+        boot_row.add_widget(self.boot_banner_input)
+        self.add_widget(boot_row)
+
         # Spacer
         self.add_widget(Widget(size_hint=(1, 0.05)))
 
@@ -156,41 +183,77 @@ class FirmwareToolUI(BoxLayout):
         """Spawn a daemon thread for flashing so the UI thread is free."""
         dim_btn(self.flash_btn)
 
+        boot_banner = None
+        if self.boot_btn.state == "down":
+            boot_banner = self.boot_banner_input.text.strip()
+            try:
+                re.compile(boot_banner)
+            except re.error as e:
+                self.log(f"Invalid boot banner regex: {e}")
+                undim_btn(self.flash_btn)
+                return
+
         Thread(
-            target=self.__confirm_flash_proceed, args=(port,), daemon=True
+            target=self.__confirm_flash_proceed,
+            args=(port, boot_banner),
+            daemon=True,
         ).start()
 
-    def __confirm_flash_proceed(self, port):
-        """Runs in a worker thread to flash firmware."""
-        try:
-            ser = serial.Serial(
-                port, 115200, parity=serial.PARITY_EVEN, timeout=1
-            )
-        except Exception as e:
-            Clock.schedule_once(
-                lambda dt, err=e: self.log(f"Could not open port {port}: {err}")
-            )
-            return
-
-        time.sleep(1)
-
-        Clock.schedule_once(
-            lambda dt: self.log(
-                f"Starting firmware update on {port} with {self.bin_path}"
-            )
-        )
+    def __confirm_flash_proceed(self, port, boot_banner=None):
+        """Runs in a worker thread to flash firmware.
 
+        boot_banner is None to skip the post-flash boot monitor, otherwise
+        the banner regex to look for ("" to only time the first byte).
+        """
+        record = FlashRecord(port, self.bin_path, baud=115200)
         try:
-            flash_image(ser, self.bin_path)
-            Clock.schedule_once(
-                lambda dt: self.log("Firmware update successful.")
-            )
+            with get_session_pool().lease(
+                port, owner="firmware flash"
+            ) as session:
+                Clock.schedule_once(
+                    lambda dt: self.log(
+                        f"Starting firmware update on {port} "
+                        f"with {self.bin_path}"
+                    )
+                )
+                try:
+                    sync = flash_image(
+                        session.ser,
+                        self.bin_path,
+                        phases=record.phases,
+                        device=record.usb_serial or port,
+                        synced=session.synced,
+                    )
+                finally:
+                    session.synced = False  # Go (or a failure) left it.
+                record.retries = sync.retries
+                Clock.schedule_once(
+                    lambda dt: self.log(
+                        f"{sync.summary()}\nFirmware update successful."
+                    )
+                )
+                if boot_banner is not None:
+                    report = monitor_boot(
+                        session.ser,
+                        sync.go_acked_at,
+                        banner_regex=boot_banner or None,
+                    )
+                    report.add_phases(record.phases)
+                    Clock.schedule_once(
+                        lambda dt, r=report: self.log(
+                            r.summary()
+                            + "\n"
+                            + r.capture.decode("utf-8", errors="replace")
+                        )
+                    )
+            record.finish()
         except Exception as e:
+            record.finish(e)
             Clock.schedule_once(
                 lambda dt, err=e: self.log(f"Error during flash: {err}")
             )
         finally:
-            ser.close()
+            get_history().submit(record)
 
             Clock.schedule_once(lambda dt: undim_btn(self.flash_btn))
 
@@ -285,15 +348,48 @@ class TerminalUI(BoxLayout):
 
         self.add_widget(top)
 
+        # Search row: text, /regex/ or @HH:MM:SS.mmm + level filter
+        search_row = BoxLayout(
+            orientation="horizontal", size_hint=(1, 0.1), spacing=10
+        )
+        self.search_input = TextInput(
+            hint_text="Search text, /regex/ or @HH:MM:SS.mmm",
+            multiline=False,
+            size_hint=(0.6, 1),
+            font_size=sp(14),
+        )
+        self.search_input.bind(on_text_validate=lambda *_: self.find())
+        search_row.add_widget(self.search_input)
+        self.level_filter = Spinner(
+            text="All",
+            values=["All", *LEVELS],
+            size_hint=(0.2, 1),
+            font_size=sp(14),
+        )
+        search_row.add_widget(self.level_filter)
+        search_row.add_widget(
+            Button(
+                text="Find",
+                size_hint=(0.2, 1),
+                font_size=sp(14),
+                background_normal="",
+                background_color=(0.35, 0.35, 0.35, 1),
+                on_press=lambda *_: self.find(),
+            )
+        )
+        self.add_widget(search_row)
+
         # Log (read-only)
         self.log_box = TextInput(
             text="",
             readonly=True,
             multiline=True,
-            size_hint=(1, 0.65),
+            size_hint=(1, 0.55),
             font_size=sp(14),
         )
         self.add_widget(self.log_box)
+        # Search index over log_box lines (one entry per row).
+        self._index = LogIndex()
 
         # Send row
         send_row = BoxLayout(
@@ -303,7 +399,7 @@ class TerminalUI(BoxLayout):
         self.tx_input = TextInput(
             hint_text="Type ASCII (or HEX if enabled) ...",
             multiline=False,
-            size_hint=(0.55, 1),
+            size_hint=(0.4, 1),
             font_size=sp(16),
         )
         # Bind enter key.
@@ -343,12 +439,25 @@ class TerminalUI(BoxLayout):
             )
         )
 
+        send_row.add_widget(
+            Button(
+                text="Latency",
+                size_hint=(0.15, 1),
+                font_size=sp(16),
+                background_normal="",
+                background_color=(0.35, 0.35, 0.35, 1),
+                on_press=lambda *_: self.open_latency_popup(),
+            )
+        )
+
         self.add_widget(send_row)
 
+        self._session = None
         self._ser = None
-        self._rx_thread = None
         self._rx_buf = bytearray()
-        self._running = False
+        # TX -> RX latency, every TX is timestamped (see latency.py).
+        self._probe = LatencyProbe()
+        self._rx_latency = None
 
         self.refresh_ports()
 
@@ -364,7 +473,9 @@ class TerminalUI(BoxLayout):
             f"Ports refreshed: {', '.join(found_ports) if found_ports else MSG_NO_PORTS_FOUND}"
         )
 
-    def _append(self, msg: str):
+    def _append(self, msg: str, ts: float | None = None):
+        for line in msg.split("\n"):
+            self._index.append(line, ts)
         self.log_box.text += msg + "\n"
         # scroll to end
         try:
@@ -374,15 +485,66 @@ class TerminalUI(BoxLayout):
         except Exception:
             pass
 
+    def _scroll_to(self, row: int):
+        try:
+            self.log_box.cursor = (0, min(row, len(self._index) - 1))
+        except Exception:
+            pass
+
+    def find(self):
+        """Search the indexed log, or jump to a time with @HH:MM:SS.mmm."""
+        query = self.search_input.text.strip()
+        level = self.level_filter.text
+        level = None if level == "All" else level
+        if not len(self._index):
+            return
+        try:
+            if query.startswith("@"):
+                self._scroll_to(
+                    self._index.line_at(
+                        parse_time_of_day(query[1:], self._index.timestamps[0])
+                    )
+                )
+                return
+            regex = len(query) > 1 and query[0] == query[-1] == "/"
+            hits = self._index.search(
+                query[1:-1] if regex else query,
+                regex=regex,
+                ignore_case=True,
+                level=level,
+                limit=SEARCH_MAX_RESULTS,
+            )
+        except (ValueError, re.error) as e:
+            self._show_results(f"Invalid search: {e}")
+            return
+
+        if hits:
+            self._scroll_to(hits[0])
+        lines = []
+        for n in hits:
+            ts, text = self._index.line(n)
+            lines.append(f"{n + 1:>6} {format_timestamp(ts)} | {text}")
+        more = "+" if len(hits) >= SEARCH_MAX_RESULTS else ""
+        self._show_results(
+            f"{len(hits)}{more} match(es) in {len(self._index)} lines\n"
+            + "\n".join(lines)
+        )
+
+    def _show_results(self, text: str, title: str = "Search results"):
+        Popup(
+            title=title,
+            content=TextInput(
+                text=text,
+                readonly=True,
+                font_size=sp(14),
+                font_name="RobotoMono-Regular",
+            ),
+            size_hint=(0.9, 0.8),
+        ).open()
+
     def toggle_connect(self, *_):
         if self._ser:
-            self._running = False
-            try:
-                self._ser.close()
-            except Exception:
-                pass
-            self._ser = None
-            self.connect_btn.text = "Connect"
+            self.disconnect()
             self._append("Disconnected.")
             return
 
@@ -392,8 +554,34 @@ class TerminalUI(BoxLayout):
             return
 
         try:
-            self._ser = open_serial_port(port, baud=115200)
+            self._session = get_session_pool().acquire(
+                port,
+                baud=115200,
+                parity=serial.PARITY_NONE,
+                timeout=0,
+                owner="UART terminal",
+            )
+        except Exception as e:
+            self._append(f"Connect failed: {e}")
+            return
+        # Terminal traffic leaves any bootloader state unknown.
+        self._session.synced = False
+        self._ser = self._session.ser
+        self._ser.reset_input_buffer()
+
+        # RX is serviced by the shared monitor I/O thread.
+        try:
+            get_serial_monitor().add_port(
+                port,
+                ser=self._ser,
+                on_data=self._handle_rx,
+                on_error=lambda err: Clock.schedule_once(
+                    lambda *_: self._append(f"RX error: {err}")
+                ),
+            )
         except Exception as e:
+            get_session_pool().release(self._session)
+            self._session = None
             self._ser = None
             self._append(f"Connect failed: {e}")
             return
@@ -401,44 +589,60 @@ class TerminalUI(BoxLayout):
         self.connect_btn.text = "Disconnect"
         self._append(f"Connected to {port} @ 115200.")
 
-        self._running = True
-        self._rx_thread = Thread(target=self._rx_loop, daemon=True)
-        self._rx_thread.start()
-
-    def _rx_loop(self):
-        while self._running and self._ser:
-            try:
-                n = self._ser.in_waiting
-                data = self._ser.read(n if n else 1)
-                if not data:
-                    continue
+    def disconnect(self):
+        """Stop RX and hand the port back to the session pool."""
+        if self._session:
+            get_serial_monitor().remove_port(self._session.port)
+            get_session_pool().release(self._session)
+        self._session = None
+        self._ser = None
+        self.connect_btn.text = "Connect"
 
-                self._rx_buf.extend(data)
+    def _handle_rx(self, data: bytes):
+        """Buffer RX bytes and schedule complete lines for display."""
+        ts = time.time()
+        now = time.perf_counter()
+        latency = self._probe.on_rx_data(now)
+        if latency is not None:
+            self._rx_latency = latency
+        self._rx_buf.extend(data)
 
-                # Emit complete lines (keeps messages together).
-                while b"\n" in self._rx_buf:
-                    line, _, rest = self._rx_buf.partition(b"\n")
-                    self._rx_buf = bytearray(rest)
+        # Emit complete lines (keeps messages together).
+        while b"\n" in self._rx_buf:
+            line, _, rest = self._rx_buf.partition(b"\n")
+            self._rx_buf = bytearray(rest)
 
-                    # Include the '\n' you consumed (optional).
-                    line_bytes = line + b"\n"
+            # Include the '\n' you consumed (optional).
+            line_bytes = line + b"\n"
 
-                    text = line_bytes.decode("utf-8", errors="replace").rstrip(
-                        "\r\n"
-                    )
-                    hex_part = line_bytes.hex(" ").upper()
+            text = line_bytes.decode("utf-8", errors="replace").rstrip("\r\n")
+            hex_part = line_bytes.hex(" ").upper()
 
-                    Clock.schedule_once(
-                        lambda *_, t=text, h=hex_part: self._append(
-                            f"RX: {t}   [{h}]"
-                        )
-                    )
+            latency = self._probe.on_rx_line(text, now)
+            if latency is None:
+                latency, self._rx_latency = self._rx_latency, None
+            rtt = f"   (+{latency * 1000:.2f} ms)" if latency else ""
 
-            except Exception as e:
-                Clock.schedule_once(
-                    lambda *_, err=e: self._append(f"RX error: {err}")
+            Clock.schedule_once(
+                lambda *_, t=text, h=hex_part, r=rtt: self._append(
+                    f"RX: {t}   [{h}]{r}", ts
                 )
-                break
+            )
+
+    def _build_payload(self, raw: str) -> bytes:
+        if self.hex_mode.text == "HEX":
+            return parse_hex(raw)
+        cooked = raw.encode("utf-8").decode("unicode_escape")
+        # Append newline based on dropdown (ASCII mode only).
+        eol = self.eol_mode.text
+        if eol == "LF":
+            if not cooked.endswith("\n"):
+                cooked += "\n"
+        elif eol == "CRLF":
+            if not cooked.endswith("\n"):
+                cooked += "\r\n"
+        # "None" -> do nothing.
+        return cooked.encode("utf-8")
 
     def send_line(self):
         def _restore_input_focus():
@@ -451,20 +655,8 @@ class TerminalUI(BoxLayout):
         if not raw:
             return
         try:
-            if self.hex_mode.text == "HEX":
-                payload = parse_hex(raw)
-            else:
-                cooked = raw.encode("utf-8").decode("unicode_escape")
-                # Append newline based on dropdown (ASCII mode only).
-                eol = self.eol_mode.text
-                if eol == "LF":
-                    if not cooked.endswith("\n"):
-                        cooked += "\n"
-                elif eol == "CRLF":
-                    if not cooked.endswith("\n"):
-                        cooked += "\r\n"
-                # "None" -> do nothing.
-                payload = cooked.encode("utf-8")
+            payload = self._build_payload(raw)
+            self._probe.on_tx()
             write_serial_bytes(self._ser, payload)
             # Restore focus.
             Clock.schedule_once(lambda *_: _restore_input_focus())
@@ -472,6 +664,83 @@ class TerminalUI(BoxLayout):
         except Exception as e:
             self._append(f"TX error: {e}")
 
+    def open_latency_popup(self):
+        """Repeat the TX input N times at a rate and report latency."""
+        layout = BoxLayout(orientation="vertical", padding=10, spacing=10)
+        count_input = TextInput(
+            text="100", hint_text="Count", multiline=False, input_filter="int"
+        )
+        rate_input = TextInput(
+            text="10",
+            hint_text="Rate (per second)",
+            multiline=False,
+            input_filter="float",
+        )
+        pattern_input = TextInput(
+            hint_text="Response regex (empty = first RX byte)", multiline=False
+        )
+        for label, widget in (
+            ("Count", count_input),
+            ("Rate (/s)", rate_input),
+            ("Response", pattern_input),
+        ):
+            row = BoxLayout(orientation="horizontal", spacing=10)
+            row.add_widget(Label(text=label, size_hint=(0.3, 1)))
+            row.add_widget(widget)
+            layout.add_widget(row)
+
+        start_btn = Button(text="Start", background_color=(0.1, 0.6, 0.1, 1))
+        layout.add_widget(start_btn)
+        popup = Popup(
+            title=f"Latency: {self.tx_input.text!r}",
+            content=layout,
+            size_hint=(0.8, 0.6),
+        )
+
+        def _start(_):
+            popup.dismiss()
+            try:
+                count = int(count_input.text or 0)
+                rate = float(rate_input.text or 0)
+                pattern = pattern_input.text or None
+                if pattern:
+                    re.compile(pattern)
+                payload = self._build_payload(self.tx_input.text)
+            except (ValueError, re.error) as e:
+                self._append(f"Latency error: {e}")
+                return
+            if not self._ser:
+                self._append("Not connected.")
+                return
+            self._append(
+                f"Latency run: {self.tx_input.text!r} x{count} at {rate:g}/s"
+            )
+            Thread(
+                target=self._latency_run,
+                args=(payload, count, rate, pattern),
+                daemon=True,
+            ).start()
+
+        start_btn.bind(on_press=_start)
+        popup.open()
+
+    def _latency_run(self, payload: bytes, count: int, rate: float, pattern):
+        """Runs in a worker thread, the monitor I/O thread feeds the probe."""
+        try:
+            samples, timeouts = measure(
+                lambda: write_serial_bytes(self._ser, payload),
+                self._probe,
+                count,
+                rate,
+                pattern,
+            )
+            text = latency_report(samples, timeouts)
+        except Exception as e:
+            text = f"Latency run failed: {e}"
+        Clock.schedule_once(
+            lambda *_: self._show_results(text, title="Latency results")
+        )
+
 
 class RootUI(BoxLayout):
     """Page-swap UI: Firmware flasher + UART terminal."""
@@ -535,16 +804,16 @@ class PyBlasherApp(App):
         return self.root_ui
 
     def on_stop(self):
-        # Ensure serial port is closed when the app exits.
+        # Ensure serial ports are closed when the app exits.
         try:
             if hasattr(self, "root_ui") and getattr(
                 self.root_ui, "term_ui", None
             ):
-                self.root_ui.term_ui._running = False
                 if self.root_ui.term_ui._ser:
-                    self.root_ui.term_ui._ser.close()
+                    self.root_ui.term_ui.disconnect()
         except Exception:
             pass
+        get_session_pool().close_all()
 
 
 def run_gui():
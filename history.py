@@ -0,0 +1,294 @@
+"""Flash session history (local SQLite store with a batched writer)."""
+
+import atexit
+import hashlib
+import os
+import queue
+import sqlite3
+import time
+from threading import Lock, Thread
+
+from constants import (
+    HISTORY_BATCH_SIZE,
+    HISTORY_DB_PATH,
+    HISTORY_FLUSH_INTERVAL_S,
+)
+from util import get_usb_serial, percentile
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL,
+    port TEXT,
+    usb_serial TEXT,
+    image_sha256 TEXT,
+    image_size INTEGER,
+    baud INTEGER,
+    retries INTEGER NOT NULL DEFAULT 0,
+    outcome TEXT NOT NULL,
+    error TEXT,
+    duration_s REAL
+);
+CREATE TABLE IF NOT EXISTS phases (
+    session_id INTEGER NOT NULL REFERENCES sessions(id),
+    name TEXT NOT NULL,
+    duration_s REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_started_at ON sessions(started_at);
+CREATE INDEX IF NOT EXISTS phases_session_id ON phases(session_id);
+"""
+
+OUTCOME_OK = "ok"
+OUTCOME_ERROR = "error"
+
+
+def connect(db_path: str = HISTORY_DB_PATH) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class FlashRecord:
+    """One flash session, filled in by the caller as it runs."""
+
+    def __init__(self, port: str, image_path: str, baud: int = 115200):
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.port = port
+        self.usb_serial = None
+        try:
+            self.usb_serial = get_usb_serial(port)
+        except Exception:
+            pass
+        self.image_sha256 = None
+        self.image_size = None
+        try:
+            with open(image_path, "rb") as f:
+                data = f.read()
+            self.image_sha256 = hashlib.sha256(data).hexdigest()
+            self.image_size = len(data)
+        except OSError:
+            pass
+        self.baud = baud
+        self.retries = 0
+        self.phases = {}  # Phase name -> duration (s), see flash_image.
+        self.outcome = None
+        self.error = None
+        self.duration_s = None
+
+    def finish(self, error: Exception | None = None):
+        self.duration_s = time.perf_counter() - self._start
+        self.outcome = OUTCOME_ERROR if error else OUTCOME_OK
+        self.error = str(error) if error else None
+
+
+class HistoryWriter:
+    """Queue records and write them in batches from a background thread.
+
+    submit() never touches the database, so flashing threads (and the UI)
+    are not blocked on disk I/O.
+    """
+
+    def __init__(self, db_path: str = HISTORY_DB_PATH):
+        self.db_path = db_path
+        self._queue = queue.Queue()
+        self._thread = Thread(target=self._writer_loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, record: FlashRecord):
+        self._queue.put(record)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _writer_loop(self):
+        conn = None
+        try:
+            stop = False
+            while not stop:
+                try:
+                    first = self._queue.get(timeout=HISTORY_FLUSH_INTERVAL_S)
+                except queue.Empty:
+                    continue
+                batch = [first]
+                while len(batch) < HISTORY_BATCH_SIZE:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if None in batch:
+                    stop = True
+                    batch = [r for r in batch if r is not None]
+                if not batch:
+                    continue
+                try:
+                    if conn is None:
+                        conn = connect(self.db_path)
+                    self._write_batch(conn, batch)
+                except (sqlite3.Error, OSError) as e:
+                    # Drop this batch but keep recording; reconnect next time.
+                    print(f"Flash history: lost {len(batch)} record(s): {e}")
+                    if conn is not None:
+                        conn.close()
+                        conn = None
+        finally:
+            if conn is not None:
+                conn.close()
+
+    @staticmethod
+    def _write_batch(conn: sqlite3.Connection, batch: list[FlashRecord]):
+        with conn:
+            for r in batch:
+                cur = conn.execute(
+                    "INSERT INTO sessions (started_at, port, usb_serial, "
+                    "image_sha256, image_size, baud, retries, outcome, error, "
+                    "duration_s) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        r.started_at,
+                        r.port,
+                        r.usb_serial,
+                        r.image_sha256,
+                        r.image_size,
+                        r.baud,
+                        r.retries,
+                        r.outcome,
+                        r.error,
+                        r.duration_s,
+                    ),
+                )
+                conn.executemany(
+                    "INSERT INTO phases (session_id, name, duration_s) "
+                    "VALUES (?, ?, ?)",
+                    [(cur.lastrowid, n, d) for n, d in r.phases.items()],
+                )
+
+
+_writer = None
+_writer_lock = Lock()
+
+
+def get_history() -> HistoryWriter:
+    """Process wide history writer, flushed at interpreter exit."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = HistoryWriter()
+            atexit.register(_writer.close)
+        return _writer
+
+
+def parse_window(text: str) -> float:
+    """Parse a time window such as '30m', '24h', '7d' or '2w' to seconds."""
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+    text = text.strip().lower()
+    if text and text[-1] in units:
+        seconds = float(text[:-1]) * units[text[-1]]
+    else:
+        seconds = float(text)
+    if not 0 <= seconds < float("inf"):
+        raise ValueError(f"Invalid time window {text!r}")
+    return seconds
+
+
+def query_stats(conn: sqlite3.Connection, since: float) -> dict:
+    """Aggregate sessions started at or after since (epoch seconds)."""
+    # Throughput over the write phase only: session durations also cover
+    # port open, sync and the optional boot monitor.
+    rows = conn.execute(
+        "SELECT s.port, s.outcome, s.image_size, p.duration_s FROM sessions s "
+        "LEFT JOIN phases p ON p.session_id = s.id AND p.name = 'write' "
+        "WHERE s.started_at >= ?",
+        (since,),
+    ).fetchall()
+
+    throughput = [
+        size / write_s
+        for _, outcome, size, write_s in rows
+        if outcome == OUTCOME_OK and size and write_s
+    ]
+
+    ports = {}
+    for port, outcome, _, _ in rows:
+        total, failed = ports.get(port, (0, 0))
+        ports[port] = (total + 1, failed + (outcome != OUTCOME_OK))
+
+    durations = {}
+    for name, duration in conn.execute(
+        "SELECT p.name, p.duration_s FROM phases p "
+        "JOIN sessions s ON s.id = p.session_id WHERE s.started_at >= ?",
+        (since,),
+    ):
+        durations.setdefault(name, []).append(duration)
+    phases = sorted(
+        (
+            (
+                name,
+                sum(values) / len(values),
+                percentile(values, 95),
+                max(values),
+            )
+            for name, values in durations.items()
+        ),
+        key=lambda phase: phase[1],
+        reverse=True,
+    )
+
+    return {
+        "sessions": len(rows),
+        "failures": sum(failed for _, failed in ports.values()),
+        "throughput": throughput,
+        "ports": ports,
+        "phases": phases,
+    }
+
+
+def run_stats(window: str = "7d", db_path: str = HISTORY_DB_PATH) -> int:
+    """Print throughput, per-port failure rates and slowest phases."""
+    try:
+        since = time.time() - parse_window(window)
+    except ValueError:
+        print(f"Invalid --since {window!r}, expected e.g. 30m, 24h, 7d or 2w")
+        return 2
+    if not os.path.exists(db_path):
+        print(f"No flash history found at {db_path}")
+        return 0
+    try:
+        conn = connect(db_path)
+        try:
+            stats = query_stats(conn, since)
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Could not read flash history {db_path}: {e}")
+        return 1
+
+    print(
+        f"Flash sessions in the last {window}: {stats['sessions']} "
+        f"({stats['failures']} failed)"
+    )
+    if not stats["sessions"]:
+        return 0
+
+    print("\nWrite throughput (KiB/s, successful sessions):")
+    if stats["throughput"]:
+        kib = [t / 1024 for t in stats["throughput"]]
+        print(
+            f"\tmin {min(kib):.1f}  p10 {percentile(kib, 10):.1f}  "
+            f"p50 {percentile(kib, 50):.1f}  p90 {percentile(kib, 90):.1f}  "
+            f"max {max(kib):.1f}"
+        )
+    else:
+        print("\tNo successful sessions")
+
+    print("\nFailure rate per port:")
+    for port, (total, failed) in sorted(
+        stats["ports"].items(), key=lambda p: p[1][1] / p[1][0], reverse=True
+    ):
+        print(f"\t{port}: {failed}/{total} ({100 * failed / total:.1f}%)")
+
+    print("\nSlowest phases (seconds):")
+    for name, mean, p95, worst in stats["phases"]:
+        print(f"\t{name:<16} mean {mean:.3f}  p95 {p95:.3f}  max {worst:.3f}")
+    return 0
@@ -0,0 +1,224 @@
+"""TX -> RX round-trip latency measurement for the UART terminal."""
+
+import re
+import time
+from threading import Event, Lock, Thread
+
+import serial
+
+from constants import LATENCY_HISTOGRAM_BINS, LATENCY_TIMEOUT_S
+from util import percentile
+
+EOLS = {"None": "", "LF": "\n", "CRLF": "\r\n"}
+
+
+class LatencyProbe:
+    """Match a TX to the first RX byte after it, or the first RX line
+    matching a response pattern, using time.perf_counter() timestamps.
+
+    One request is outstanding at a time; a new on_tx() replaces it.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._done = Event()
+        self._t0 = None
+        self._pattern = None
+        self.last = None  # Latest latency (s).
+
+    def on_tx(self, pattern: str | None = None, ts: float | None = None):
+        with self._lock:
+            self._pattern = re.compile(pattern) if pattern else None
+            self.last = None
+            self._done.clear()
+            self._t0 = time.perf_counter() if ts is None else ts
+
+    def on_rx_data(self, ts: float) -> float | None:
+        """Call as RX bytes arrive; returns the latency if this matched."""
+        with self._lock:
+            if self._t0 is None or self._pattern is not None:
+                return None
+            return self._finish(ts)
+
+    def on_rx_line(self, text: str, ts: float) -> float | None:
+        """Call per complete RX line; returns the latency if this matched."""
+        with self._lock:
+            if (
+                self._t0 is None
+                or self._pattern is None
+                or not self._pattern.search(text)
+            ):
+                return None
+            return self._finish(ts)
+
+    def _finish(self, ts: float) -> float:
+        self.last = ts - self._t0
+        self._t0 = None
+        self._done.set()
+        return self.last
+
+    def wait(self, timeout: float) -> float | None:
+        """Wait for the outstanding request, None on timeout."""
+        if not self._done.wait(timeout):
+            with self._lock:
+                self._t0 = None  # Give up, late replies do not count.
+            return None
+        return self.last
+
+
+def measure(
+    send,
+    probe: LatencyProbe,
+    count: int,
+    rate: float,
+    pattern: str | None = None,
+    timeout: float = LATENCY_TIMEOUT_S,
+    stop: Event | None = None,
+) -> tuple[list[float], int]:
+    """Send count requests at rate per second, return (latencies, timeouts).
+
+    send() writes one request; the probe must be fed from an RX reader.
+    Setting stop ends the run early with the results so far.
+    """
+    samples = []
+    timeouts = 0
+    period = 1.0 / rate if rate > 0 else 0
+    next_send = time.perf_counter()
+    for _ in range(count):
+        if stop and stop.is_set():
+            break
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            if stop:
+                if stop.wait(delay):
+                    break
+            else:
+                time.sleep(delay)
+        next_send += period
+        probe.on_tx(pattern)
+        send()
+        latency = probe.wait(timeout)
+        if latency is None:
+            if stop and stop.is_set():
+                break  # Cancelled while waiting, not a device timeout.
+            timeouts += 1
+        else:
+            samples.append(latency)
+    return samples, timeouts
+
+
+def histogram(
+    samples: list[float], bins: int = LATENCY_HISTOGRAM_BINS, width: int = 40
+) -> str:
+    """ASCII histogram of latencies (seconds), labelled in milliseconds."""
+    if not samples:
+        return ""
+    ms = [s * 1000 for s in samples]
+    low, high = min(ms), max(ms)
+    step = (high - low) / bins or 1.0
+    counts = [0] * bins
+    for value in ms:
+        counts[min(int((value - low) / step), bins - 1)] += 1
+    peak = max(counts)
+    return "\n".join(
+        f"{low + i * step:8.2f}-{low + (i + 1) * step:8.2f} ms | "
+        f"{'#' * round(width * n / peak):<{width}} {n}"
+        for i, n in enumerate(counts)
+    )
+
+
+def report(samples: list[float], timeouts: int = 0) -> str:
+    """min/p50/p99/max summary plus histogram."""
+    if not samples:
+        return f"No responses ({timeouts} timeout(s))"
+    ms = [s * 1000 for s in samples]
+    return (
+        f"Latency over {len(ms)} response(s), {timeouts} timeout(s):\n"
+        f"min {min(ms):.2f}  p50 {percentile(ms, 50):.2f}  "
+        f"p99 {percentile(ms, 99):.2f}  max {max(ms):.2f} ms\n"
+        f"{histogram(samples)}"
+    )
+
+
+def run_latency(
+    port: str,
+    command: str,
+    count: int = 100,
+    rate: float = 10,
+    pattern: str | None = None,
+    timeout: float = LATENCY_TIMEOUT_S,
+    baud: int = 115200,
+    eol: str = "CRLF",
+):
+    """Headless latency run against a port, printing the report."""
+    from session_pool import get_session_pool
+
+    payload = (
+        command.encode("utf-8").decode("unicode_escape") + EOLS[eol]
+    ).encode("utf-8")
+    probe = LatencyProbe()
+    stop = Event()
+
+    with get_session_pool().lease(
+        port,
+        baud=baud,
+        parity=serial.PARITY_NONE,
+        timeout=0.05,
+        owner="latency profiler",
+    ) as session:
+        ser = session.ser
+        session.synced = False
+        ser.reset_input_buffer()
+
+        def _reader():
+            buf = bytearray()
+            while not stop.is_set():
+                n = ser.in_waiting
+                data = ser.read(n if n else 1)
+                if not data:
+                    continue
+                now = time.perf_counter()
+                probe.on_rx_data(now)
+                buf.extend(data)
+                while b"\n" in buf:
+                    line, _, rest = buf.partition(b"\n")
+                    buf = bytearray(rest)
+                    probe.on_rx_line(
+                        line.decode("utf-8", errors="replace").rstrip("\r"),
+                        now,
+                    )
+
+        def _send():
+            ser.write(payload)
+            ser.flush()
+
+        reader = Thread(target=_reader, daemon=True)
+        reader.start()
+        print(
+            f"Sending {command!r} x{count} at {rate:g}/s on {port}"
+            + (f", response pattern {pattern!r}" if pattern else "")
+        )
+        # Measure off the main thread so Ctrl+C cancels the run and still
+        # reports the responses collected so far.
+        cancel = Event()
+        result = []
+        worker = Thread(
+            target=lambda: result.append(
+                measure(_send, probe, count, rate, pattern, timeout, cancel)
+            ),
+            daemon=True,
+        )
+        worker.start()
+        try:
+            while worker.is_alive():
+                worker.join(0.1)
+        except KeyboardInterrupt:
+            cancel.set()
+            worker.join()
+            print("Cancelled")
+        finally:
+            stop.set()
+            reader.join(timeout=1)
+        samples, timeouts = result[0] if result else ([], 0)
+
+    print(report(samples, timeouts))
@@ -0,0 +1,310 @@
+"""Incremental search index over terminal/monitor log lines."""
+
+import re
+import time
+from array import array
+from bisect import bisect_left
+
+from util import format_timestamp
+
+GRAM = 3  # Trigram index.
+
+LEVELS = ("ERROR", "WARN", "INFO", "DEBUG")
+_LEVEL_RE = re.compile(
+    r"\b(ERROR|ERR|FATAL|WARNING|WARN|INFO|DEBUG|DBG|TRACE)\b", re.IGNORECASE
+)
+_LEVEL_ALIASES = {
+    "ERR": "ERROR",
+    "FATAL": "ERROR",
+    "WARNING": "WARN",
+    "DBG": "DEBUG",
+    "TRACE": "DEBUG",
+}
+
+_REGEX_SPECIAL = set("\\.^$*+?{}[]()|")
+
+
+def detect_level(text: str) -> str | None:
+    match = _LEVEL_RE.search(text)
+    if not match:
+        return None
+    level = match.group(1).upper()
+    return _LEVEL_ALIASES.get(level, level)
+
+
+def grams(text: str) -> set[str]:
+    text = text.lower()
+    return {text[i : i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+def required_literals(pattern: str) -> list[str]:
+    """Literal runs every match of a simple regex must contain.
+
+    Conservative: returns [] (no prefilter) for alternations and groups,
+    skips escapes, character classes, {m,n} quantifiers and optional
+    characters.
+
+    >>> required_literals(r"temp=\d{2,3}C")
+    ['temp=']
+    >>> required_literals(r"\d{1,3}")
+    []
+    >>> required_literals("boot (ok|fail)")
+    []
+    """
+    if "|" in pattern or "(" in pattern:
+        return []
+    literals = []
+    run = ""
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            literals.append(run)
+            run = ""
+            i += 2
+            continue
+        if c == "[":
+            literals.append(run)
+            run = ""
+            end = pattern.find("]", i + 2)
+            i = len(pattern) if end < 0 else end + 1
+            continue
+        if c in "?*{" and run:
+            run = run[:-1]  # Previous character is optional.
+        if c == "{":
+            literals.append(run)
+            run = ""
+            end = pattern.find("}", i + 1)
+            i = len(pattern) if end < 0 else end + 1
+            continue
+        if c in _REGEX_SPECIAL:
+            literals.append(run)
+            run = ""
+        else:
+            run += c
+        i += 1
+    literals.append(run)
+    return [literal for literal in literals if len(literal) >= GRAM]
+
+
+class _MemoryLines:
+    def __init__(self):
+        self._lines = []
+
+    def append(self, text: str):
+        self._lines.append(text)
+
+    def get(self, n: int) -> str:
+        return self._lines[n]
+
+
+class _CaptureLines:
+    """Lines of a capture file ("<timestamp>\\t<text>" per line)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offsets = array("Q")
+        self._file = open(path, "rb")
+
+    def get(self, n: int) -> str:
+        self._file.seek(self.offsets[n])
+        return _parse_capture_line(self._file.readline())[1]
+
+    def close(self):
+        self._file.close()
+
+
+def _parse_capture_line(raw: bytes) -> tuple[float | None, str]:
+    text = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+    stamp, sep, rest = text.partition("\t")
+    if sep:
+        try:
+            return float(stamp), rest
+        except ValueError:
+            pass
+    return None, text
+
+
+class LogIndex:
+    """Line offsets, timestamps, levels and a trigram index, built as lines
+    are appended, so searches and time jumps never rescan the whole log.
+
+    Lines live in memory (append()) or stay in an on-disk capture file
+    (from_capture()/refresh(), only byte offsets are kept).
+    """
+
+    def __init__(self, store=None):
+        self._store = store if store is not None else _MemoryLines()
+        self.timestamps = array("d")  # Non-decreasing, seconds.
+        self._grams = {}  # Trigram -> array of line numbers.
+        self._levels = {level: array("I") for level in LEVELS}
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @classmethod
+    def from_capture(cls, path: str) -> "LogIndex":
+        index = cls(_CaptureLines(path))
+        index.refresh()
+        return index
+
+    def refresh(self) -> int:
+        """Index lines appended to the capture file since the last call."""
+        store = self._store
+        added = 0
+        with open(store.path, "rb") as f:
+            offset = store.offsets[-1] if store.offsets else 0
+            f.seek(offset)
+            if store.offsets:
+                offset += len(f.readline())  # Skip the last indexed line.
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # Partial line still being written.
+                ts, text = _parse_capture_line(raw)
+                store.offsets.append(offset)
+                self._index(text, ts)
+                offset += len(raw)
+                added += 1
+        return added
+
+    def append(self, text: str, ts: float | None = None) -> int:
+        """Add an in-memory line, return its line number."""
+        self._store.append(text)
+        return self._index(text, ts)
+
+    def _index(self, text: str, ts: float | None) -> int:
+        n = len(self.timestamps)
+        if ts is None:
+            ts = time.time()
+        if self.timestamps and ts < self.timestamps[-1]:
+            ts = self.timestamps[-1]  # Keep bisectable.
+        self.timestamps.append(ts)
+        for gram in grams(text):
+            postings = self._grams.get(gram)
+            if postings is None:
+                postings = self._grams[gram] = array("I")
+            postings.append(n)
+        level = detect_level(text)
+        if level:
+            self._levels[level].append(n)
+        return n
+
+    def line(self, n: int) -> tuple[float, str]:
+        return self.timestamps[n], self._store.get(n)
+
+    def line_at(self, ts: float) -> int:
+        """First line at or after ts (len(self) if none)."""
+        return bisect_left(self.timestamps, ts)
+
+    def _candidates(
+        self,
+        literals: list[str],
+        level: str | None,
+        start: float | None,
+        end: float | None,
+    ):
+        first = 0 if start is None else self.line_at(start)
+        last = len(self) if end is None else self.line_at(end)
+        sets = []
+        for literal in literals:
+            for gram in grams(literal):
+                postings = self._grams.get(gram)
+                if postings is None:
+                    return []
+                sets.append(postings)
+        if level:
+            if level not in self._levels:
+                raise ValueError(f"Unknown level {level!r}")
+            sets.append(self._levels[level])
+        if not sets:
+            return range(first, last)
+        sets.sort(key=len)
+        result = set(sets[0][bisect_left(sets[0], first) :])
+        for postings in sets[1:]:
+            result.intersection_update(postings)
+            if not result:
+                return []
+        return sorted(n for n in result if n < last)
+
+    def search(
+        self,
+        query: str,
+        regex: bool = False,
+        ignore_case: bool = False,
+        level: str | None = None,
+        start: float | None = None,
+        end: float | None = None,
+        limit: int | None = None,
+    ) -> list[int]:
+        """Line numbers matching a substring (or regex) and filters."""
+        if regex:
+            pattern = re.compile(query, re.IGNORECASE if ignore_case else 0)
+            literals = required_literals(query)
+            matches = pattern.search
+        else:
+            literals = [query] if len(query) >= GRAM else []
+            needle = query.lower() if ignore_case else query
+
+            def matches(text):
+                return needle in (text.lower() if ignore_case else text)
+
+        found = []
+        for n in self._candidates(literals, level, start, end):
+            if matches(self._store.get(n)):
+                found.append(n)
+                if limit and len(found) >= limit:
+                    break
+        return found
+
+    def close(self):
+        if isinstance(self._store, _CaptureLines):
+            self._store.close()
+
+
+def parse_time_of_day(text: str, reference: float | None = None) -> float:
+    """'HH:MM:SS[.mmm]' on the reference day (default today) to epoch."""
+    clock, _, millis = text.strip().partition(".")
+    hours, minutes, seconds = (int(part) for part in clock.split(":"))
+    day = time.localtime(reference if reference is not None else time.time())
+    midnight = time.mktime(
+        (day.tm_year, day.tm_mon, day.tm_mday, 0, 0, 0, 0, 0, -1)
+    )
+    return (
+        midnight
+        + hours * 3600
+        + minutes * 60
+        + seconds
+        + (int(millis.ljust(3, "0")[:3]) / 1000 if millis else 0)
+    )
+
+
+def run_search(
+    capture_path: str,
+    query: str | None = None,
+    regex: bool = False,
+    ignore_case: bool = False,
+    level: str | None = None,
+    at: str | None = None,
+    context: int = 10,
+    limit: int = 1000,
+):
+    """Search an on-disk capture and print the matching lines."""
+    index = LogIndex.from_capture(capture_path)
+    try:
+        if not len(index):
+            print(f"No lines in {capture_path}")
+            return
+        if at:
+            n = index.line_at(parse_time_of_day(at, index.timestamps[0]))
+            hits = range(n, min(n + context, len(index)))
+        else:
+            hits = index.search(
+                query or "", regex, ignore_case, level, limit=limit
+            )
+        for n in hits:
+            ts, text = index.line(n)
+            print(f"{n + 1:>8} {format_timestamp(ts)} | {text}")
+        if not at:
+            print(f"\t{len(hits)} match(es) in {len(index)} lines")
+    finally:
+        index.close()
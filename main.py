@@ -1,11 +1,188 @@
 """Main PyBlasher application."""
 
+import argparse
 import sys
 
 from app import run_cli
+from constants import HISTORY_DB_PATH, LATENCY_TIMEOUT_S, SERVER_IMAGE_DIR
+from log_index import LEVELS
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="pyblasher")
+    parser.add_argument(
+        "-c", "--cli", action="store_true", help="run the interactive CLI"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    monitor = subparsers.add_parser(
+        "monitor", help="monitor one or more serial ports headless"
+    )
+    monitor.add_argument(
+        "ports", nargs="*", help="ports to monitor (default: all CP2102N)"
+    )
+    monitor.add_argument("-b", "--baud", type=int, default=115200)
+    monitor.add_argument(
+        "--capture-dir", help="write a per-port capture file in this directory"
+    )
+
+    stats = subparsers.add_parser(
+        "stats", help="report flash session history statistics"
+    )
+    stats.add_argument(
+        "--since",
+        default="7d",
+        help="time window, e.g. 30m, 24h, 7d, 2w (default: 7d)",
+    )
+    stats.add_argument("--db", default=HISTORY_DB_PATH, help="history database")
+
+    profile = subparsers.add_parser(
+        "profile", help="measure GUI frame times under simulated load"
+    )
+    profile.add_argument("--duration", type=float, default=10, help="seconds")
+    profile.add_argument(
+        "--rx-rate", type=float, default=1000, help="terminal RX lines/s"
+    )
+    profile.add_argument(
+        "--log-rate", type=float, default=50, help="flash log lines/s"
+    )
+    profile.add_argument(
+        "--max-p99-ms",
+        type=float,
+        help="exit with status 1 if the frame time p99 exceeds this",
+    )
+
+    serve = subparsers.add_parser(
+        "serve", help="run the local flash server (HTTP or Unix socket API)"
+    )
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--unix", help="listen on this Unix socket path instead")
+    serve.add_argument(
+        "--image-dir", default=SERVER_IMAGE_DIR, help="uploaded image store"
+    )
+    serve.add_argument(
+        "--simulate",
+        type=int,
+        default=0,
+        metavar="N",
+        help="add N simulated bootloader ports (sim://0 ...)",
+    )
+
+    search = subparsers.add_parser(
+        "search", help="search a monitor capture file"
+    )
+    search.add_argument("capture", help="capture file (see monitor)")
+    search.add_argument("query", nargs="?", default="", help="text or regex")
+    search.add_argument(
+        "-r", "--regex", action="store_true", help="query is a regex"
+    )
+    search.add_argument("-i", "--ignore-case", action="store_true")
+    search.add_argument(
+        "-l", "--level", choices=LEVELS, help="only lines with this level"
+    )
+    search.add_argument(
+        "--at", metavar="HH:MM:SS.mmm", help="show the lines from this time"
+    )
+
+    latency = subparsers.add_parser(
+        "latency", help="measure TX to RX round-trip latency on a port"
+    )
+    latency.add_argument("port")
+    latency.add_argument(
+        "tx_command", metavar="command", help="ASCII command (escapes allowed)"
+    )
+    latency.add_argument("-n", "--count", type=int, default=100)
+    latency.add_argument(
+        "--rate", type=float, default=10, help="commands per second"
+    )
+    latency.add_argument(
+        "--pattern", help="response regex (default: first RX byte)"
+    )
+    latency.add_argument(
+        "--timeout", type=float, default=LATENCY_TIMEOUT_S, help="seconds"
+    )
+    latency.add_argument("-b", "--baud", type=int, default=115200)
+    latency.add_argument(
+        "--eol", choices=["None", "LF", "CRLF"], default="CRLF"
+    )
+
+    manifest = subparsers.add_parser(
+        "flash-manifest",
+        help="flash several images in one bootloader session",
+    )
+    manifest.add_argument("manifest", help="JSON manifest file")
+    manifest.add_argument(
+        "-p", "--port", help="port to flash (default: first CP2102N)"
+    )
+    manifest.add_argument(
+        "--check",
+        action="store_true",
+        help="validate and print the plan without flashing",
+    )
+
+    return parser
+
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1 and sys.argv[1] in ("-c", "--cli"):
+    args = build_parser().parse_args()
+
+    if args.command == "monitor":
+        from monitor import run_monitor
+        from util import find_cp2102n_ports
+
+        run_monitor(
+            args.ports or find_cp2102n_ports(), args.baud, args.capture_dir
+        )
+    elif args.command == "stats":
+        from history import run_stats
+
+        sys.exit(run_stats(args.since, args.db))
+    elif args.command == "profile":
+        from profiler import run_profile
+
+        sys.exit(
+            run_profile(
+                args.duration, args.rx_rate, args.log_rate, args.max_p99_ms
+            )
+        )
+    elif args.command == "serve":
+        from server import run_server
+
+        sys.exit(
+            run_server(
+                args.host, args.port, args.unix, args.image_dir, args.simulate
+            )
+        )
+    elif args.command == "search":
+        from log_index import run_search
+
+        run_search(
+            args.capture,
+            args.query,
+            args.regex,
+            args.ignore_case,
+            args.level,
+            args.at,
+        )
+    elif args.command == "latency":
+        from latency import run_latency
+
+        run_latency(
+            args.port,
+            args.tx_command,
+            args.count,
+            args.rate,
+            args.pattern,
+            args.timeout,
+            args.baud,
+            args.eol,
+        )
+    elif args.command == "flash-manifest":
+        from manifest import run_flash_manifest
+
+        sys.exit(run_flash_manifest(args.manifest, args.port, args.check))
+    elif args.cli:
         # Run CLI app
         run_cli()
     else:
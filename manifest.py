@@ -0,0 +1,340 @@
+"""Multi-image manifest flashing in a single bootloader session."""
+
+import hashlib
+import json
+import os
+
+import serial
+
+from constants import FLASH_BASE, FLASH_PAGE_SIZE, FLASH_SIZE
+from flash_firmware import (
+    SyncResult,
+    ensure_synced,
+    erase_pages,
+    go,
+    mass_erase,
+    timed_phase,
+    write_image,
+)
+
+ERASE_PAGES = "pages"  # Erase the pages the image covers (default).
+ERASE_NONE = "none"  # Region is already erased.
+ERASE_MASS = "mass"  # Mass erase the whole flash first.
+ERASE_POLICIES = (ERASE_PAGES, ERASE_NONE, ERASE_MASS)
+
+
+def _addr(value) -> int:
+    if isinstance(value, str):
+        return int(value, 0)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    raise ValueError(f"Expected an integer or a string, got {value!r}")
+
+
+class ManifestEntry:
+    def __init__(self, path: str, base_addr: int, erase: str, data: bytes):
+        self.path = path
+        self.base_addr = base_addr
+        self.erase = erase
+        self.data = data
+
+    @property
+    def end_addr(self) -> int:
+        return self.base_addr + len(self.data)
+
+
+class Manifest:
+    """Validated images, erase plan and Go address.
+
+    All checks (flash geometry, files, alignment, bounds, overlaps, Go
+    address) run in load(), before any device is touched.
+
+    JSON format::
+
+        {
+          "flash": {"base": "0x08000000", "size": "0x80000",
+                    "page_size": 2048},
+          "go": "0x08000000",
+          "images": [
+            {"path": "boot.bin", "base_addr": "0x08000000"},
+            {"path": "app.bin", "base_addr": "0x08004000"},
+            {"path": "cal.bin", "base_addr": "0x0807F800", "erase": "none"}
+          ]
+        }
+
+    "flash" defaults to FLASH_BASE/FLASH_SIZE/FLASH_PAGE_SIZE (uniform
+    pages), "go" to the first image, "erase" to "pages". Image paths are
+    relative to the manifest file.
+    """
+
+    def __init__(
+        self,
+        entries: list[ManifestEntry],
+        go_addr: int,
+        flash_base: int = FLASH_BASE,
+        flash_size: int = FLASH_SIZE,
+        page_size: int = FLASH_PAGE_SIZE,
+    ):
+        self.entries = entries
+        self.go_addr = go_addr
+        self.flash_base = flash_base
+        self.flash_size = flash_size
+        self.page_size = page_size
+        self.validate()
+
+    @classmethod
+    def load(cls, path: str) -> "Manifest":
+        with open(path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+        if not isinstance(spec, dict):
+            raise ValueError("Manifest must be a JSON object")
+        root = os.path.dirname(os.path.abspath(path))
+        flash = spec.get("flash", {})
+        if not isinstance(flash, dict):
+            raise ValueError('"flash" must be an object')
+        images = spec.get("images", [])
+        if not isinstance(images, list):
+            raise ValueError('"images" must be a list')
+
+        entries = []
+        for i, item in enumerate(images):
+            if not isinstance(item, dict):
+                raise ValueError(f"Image {i}: must be an object")
+            try:
+                image_path = item["path"]
+                base_addr = _addr(item["base_addr"])
+            except KeyError as e:
+                raise ValueError(f"Image {i}: missing field {e}")
+            if not isinstance(image_path, str):
+                raise ValueError(f"Image {i}: path must be a string")
+            image_path = os.path.join(root, image_path)
+            erase = item.get("erase", ERASE_PAGES)
+            with open(image_path, "rb") as f:
+                data = f.read()
+            entries.append(ManifestEntry(image_path, base_addr, erase, data))
+        if not entries:
+            raise ValueError("Manifest has no images")
+
+        return cls(
+            entries,
+            _addr(spec.get("go", entries[0].base_addr)),
+            _addr(flash.get("base", FLASH_BASE)),
+            _addr(flash.get("size", FLASH_SIZE)),
+            _addr(flash.get("page_size", FLASH_PAGE_SIZE)),
+        )
+
+    def validate(self):
+        if self.page_size <= 0 or self.flash_size <= 0 or self.flash_base < 0:
+            raise ValueError(
+                f"Invalid flash geometry: base 0x{self.flash_base:X}, "
+                f"size {self.flash_size}, page size {self.page_size}"
+            )
+        if self.flash_size % self.page_size:
+            raise ValueError(
+                f"Flash size {self.flash_size} is not a multiple of the "
+                f"page size {self.page_size}"
+            )
+        if self.flash_size // self.page_size > 0xFFF0:
+            # Extended Erase page numbers are 16-bit, 0xFFFx are special.
+            raise ValueError(
+                f"Too many pages ({self.flash_size // self.page_size})"
+            )
+        flash_end = self.flash_base + self.flash_size
+        if flash_end > 1 << 32:
+            raise ValueError(
+                f"Flash 0x{self.flash_base:08X}+0x{self.flash_size:X} "
+                f"exceeds the 32-bit address space"
+            )
+        for entry in self.entries:
+            name = os.path.basename(entry.path)
+            if entry.erase not in ERASE_POLICIES:
+                raise ValueError(
+                    f"{name}: unknown erase policy {entry.erase!r} "
+                    f"(expected one of {', '.join(ERASE_POLICIES)})"
+                )
+            if not entry.data:
+                raise ValueError(f"{name}: image is empty")
+            if entry.base_addr % 4:
+                raise ValueError(
+                    f"{name}: base address 0x{entry.base_addr:08X} is not "
+                    f"word aligned"
+                )
+            if entry.base_addr < self.flash_base or entry.end_addr > flash_end:
+                raise ValueError(
+                    f"{name}: 0x{entry.base_addr:08X}-0x{entry.end_addr:08X} "
+                    f"is outside flash 0x{self.flash_base:08X}-"
+                    f"0x{flash_end:08X}"
+                )
+
+        ordered = sorted(self.entries, key=lambda e: e.base_addr)
+        for a, b in zip(ordered, ordered[1:]):
+            if b.base_addr < a.end_addr:
+                raise ValueError(
+                    f"{os.path.basename(a.path)} "
+                    f"(0x{a.base_addr:08X}-0x{a.end_addr:08X}) overlaps "
+                    f"{os.path.basename(b.path)} "
+                    f"(0x{b.base_addr:08X}-0x{b.end_addr:08X})"
+                )
+
+        if not any(
+            e.base_addr <= self.go_addr < e.end_addr for e in self.entries
+        ):
+            raise ValueError(
+                f"Go address 0x{self.go_addr:08X} is not inside any image"
+            )
+
+    @property
+    def mass_erase(self) -> bool:
+        return any(e.erase == ERASE_MASS for e in self.entries)
+
+    def erase_plan(self) -> list[int]:
+        """Sorted, merged page numbers to erase (empty for mass erase)."""
+        if self.mass_erase:
+            return []
+        pages = set()
+        for entry in self.entries:
+            if entry.erase != ERASE_PAGES:
+                continue
+            first = (entry.base_addr - self.flash_base) // self.page_size
+            last = (entry.end_addr - 1 - self.flash_base) // self.page_size
+            pages.update(range(first, last + 1))
+        return sorted(pages)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(len(e.data) for e in self.entries)
+
+    @property
+    def sha256(self) -> str:
+        """Hash over every image and its base address."""
+        digest = hashlib.sha256()
+        for entry in self.entries:
+            digest.update(entry.base_addr.to_bytes(4, "big"))
+            digest.update(entry.data)
+        return digest.hexdigest()
+
+    def describe(self) -> str:
+        lines = [
+            f"0x{e.base_addr:08X}-0x{e.end_addr:08X} "
+            f"{len(e.data):>8} B  erase={e.erase:<5} "
+            f"{os.path.basename(e.path)}"
+            for e in self.entries
+        ]
+        if self.mass_erase:
+            lines.append("Erase: mass erase")
+        else:
+            pages = self.erase_plan()
+            lines.append(
+                f"Erase: {len(pages)} page(s) of {self.page_size} B"
+                + (f" ({pages[0]}-{pages[-1]})" if pages else "")
+            )
+        lines.append(f"Go: 0x{self.go_addr:08X}")
+        return "\n".join(lines)
+
+
+def flash_manifest(
+    ser: serial.Serial,
+    manifest: Manifest,
+    phases: dict | None = None,
+    device: str | None = None,
+    synced: bool = False,
+    progress=None,
+) -> SyncResult:
+    """One sync, the merged erase plan, every image in order, one Go.
+
+    Arguments as for flash_image; progress totals are over all images.
+    """
+    total = manifest.total_bytes
+
+    def _progress(phase: str, done: int = 0):
+        if progress:
+            progress(phase, done, total)
+
+    _progress("sync")
+    with timed_phase(phases, "sync"):
+        sync = ensure_synced(ser, device, synced)
+
+    _progress("erase")
+    with timed_phase(phases, "erase"):
+        if manifest.mass_erase:
+            mass_erase(ser)
+        else:
+            pages = manifest.erase_plan()
+            if pages:
+                erase_pages(ser, pages)
+
+    _progress("write")
+    with timed_phase(phases, "write"):
+        written = 0
+        for entry in manifest.entries:
+            write_image(
+                ser,
+                entry.data,
+                entry.base_addr,
+                lambda done, before=written: _progress("write", before + done),
+            )
+            written += len(entry.data)
+
+    _progress("go", total)
+    with timed_phase(phases, "go"):
+        sync.go_acked_at = go(ser, manifest.go_addr)
+
+    return sync
+
+
+def run_flash_manifest(
+    manifest_path: str, port: str | None = None, check: bool = False
+):
+    """Validate a manifest, then flash it (CLI)."""
+    from history import FlashRecord, get_history
+    from session_pool import get_session_pool
+    from util import find_cp2102n_ports
+
+    try:
+        manifest = Manifest.load(manifest_path)
+    except (OSError, ValueError) as e:
+        print(f"Invalid manifest: {e}")
+        return 1
+    print(manifest.describe())
+    if check:
+        return 0
+
+    if port is None:
+        ports = find_cp2102n_ports()
+        if not ports:
+            print("No CP2102N devices found, pass --port")
+            return 1
+        port = ports[0]
+
+    print(f"Flashing {len(manifest.entries)} image(s) on {port}")
+    record = FlashRecord(port, manifest_path)
+    record.image_sha256 = manifest.sha256
+    record.image_size = manifest.total_bytes
+    try:
+        with get_session_pool().lease(port, owner="manifest flash") as session:
+            try:
+                sync = flash_manifest(
+                    session.ser,
+                    manifest,
+                    phases=record.phases,
+                    device=record.usb_serial or port,
+                    synced=session.synced,
+                )
+            finally:
+                session.synced = False
+        record.retries = sync.retries
+        record.finish()
+    except (RuntimeError, ValueError, OSError, serial.SerialException) as e:
+        record.finish(e)
+        print(f"\tFlash failed: {e}")
+        return 1
+    finally:
+        get_history().submit(record)
+
+    print(f"\t{sync.summary()}")
+    print(
+        "\t"
+        + ", ".join(f"{k} {v * 1000:.1f} ms" for k, v in record.phases.items())
+    )
+    print("\tFirmware update successful")
+    return 0
@@ -0,0 +1,387 @@
+"""Multi-port serial monitor (one I/O thread services every open port)."""
+
+import atexit
+import heapq
+import os
+import selectors
+import socket
+import time
+from collections import deque
+from threading import Event, Lock, Thread, current_thread
+
+import serial
+
+from constants import MONITOR_POLL_INTERVAL_S, MONITOR_RING_LINES
+from session_pool import get_session_pool
+from util import format_timestamp
+
+
+class PortSession:
+    """Line assembly, ring buffer and optional capture file for one port.
+
+    release(dead) is called on close to hand the handle back (None for
+    handles owned by the caller).
+    """
+
+    def __init__(
+        self,
+        port: str,
+        ser: serial.Serial,
+        ring_size: int = MONITOR_RING_LINES,
+        capture_path: str | None = None,
+        on_data=None,
+        on_error=None,
+        release=None,
+    ):
+        self.port = port
+        self.ser = ser
+        self.on_data = on_data
+        self.on_error = on_error
+        self._release = release
+        self.dead = False
+        self.lines = deque(maxlen=ring_size)  # (timestamp, text)
+        self.rx_bytes = 0
+        self.rx_lines = 0
+        self._partial = bytearray()
+        self._partial_ts = None  # Timestamp of the first byte of a line.
+        self._capture = (
+            open(capture_path, "a", encoding="utf-8") if capture_path else None
+        )
+
+    def feed(self, data: bytes, ts: float) -> list[tuple[float, str]]:
+        """Consume raw RX bytes, return the complete lines they finish."""
+        self.rx_bytes += len(data)
+        if self._partial_ts is None:
+            self._partial_ts = ts
+        self._partial.extend(data)
+
+        completed = []
+        while b"\n" in self._partial:
+            line, _, rest = self._partial.partition(b"\n")
+            self._partial = bytearray(rest)
+            text = line.decode("utf-8", errors="replace").rstrip("\r")
+            completed.append((self._partial_ts, text))
+            # Remaining bytes arrived in this read, stamp them with it.
+            self._partial_ts = ts if self._partial else None
+
+        for line_ts, text in completed:
+            self.lines.append((line_ts, text))
+            if self._capture:
+                self._capture.write(f"{line_ts:.6f}\t{text}\n")
+        if completed:
+            self.rx_lines += len(completed)
+            if self._capture:
+                self._capture.flush()
+        return completed
+
+    def close(self):
+        if self._release:
+            try:
+                self._release(self.dead)
+            except Exception:
+                pass
+            self._release = None
+        if self._capture:
+            self._capture.close()
+            self._capture = None
+
+
+class SerialMonitor:
+    """Monitor many serial ports from a single selector-driven thread.
+
+    Ports exposing a file descriptor (POSIX) are registered with the
+    platform selector (epoll/kqueue/poll), so the thread sleeps until a port
+    has data and CPU usage follows traffic, not port count. Ports without a
+    descriptor (Windows) fall back to polling `in_waiting` on the same
+    thread every MONITOR_POLL_INTERVAL_S.
+
+    Ports are leased from the session pool for as long as they are
+    monitored, so a flash on the same port fails fast instead of sharing
+    the handle. Callers that already hold a lease (the GUI terminal) pass
+    its handle in and keep ownership.
+    """
+
+    def __init__(self, ring_size: int = MONITOR_RING_LINES):
+        self.ring_size = ring_size
+        self._sessions = {}
+        self._polled = []
+        self._listeners = []
+        self._lock = Lock()
+        self._pending = deque()
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._thread = None
+        self._running = False
+
+    @property
+    def ports(self) -> list[str]:
+        with self._lock:
+            return list(self._sessions)
+
+    def subscribe(self, callback):
+        """Register callback(port, timestamp, text), run on the I/O thread."""
+        self._listeners.append(callback)
+
+    def add_port(
+        self,
+        port: str,
+        baud: int = 115200,
+        capture_path: str | None = None,
+        ser: serial.Serial | None = None,
+        on_data=None,
+        on_error=None,
+    ) -> PortSession:
+        """Lease (or adopt) a port and start servicing it.
+
+        on_data(data) gets the raw RX bytes and on_error(exc) a read error,
+        both on the I/O thread. Raises RuntimeError if the port is leased
+        by someone else.
+        """
+        with self._lock:
+            if port in self._sessions:
+                raise ValueError(f"Port {port} is already monitored")
+        release = None
+        if ser is None:
+            pool = get_session_pool()
+            lease = pool.acquire(
+                port,
+                baud=baud,
+                parity=serial.PARITY_NONE,
+                timeout=0,
+                owner="serial monitor",
+            )
+            lease.synced = False
+
+            def release(dead: bool):
+                if dead:
+                    pool.discard(lease)
+                pool.release(lease)
+
+            ser = lease.ser
+        session = PortSession(
+            port,
+            ser,
+            self.ring_size,
+            capture_path,
+            on_data,
+            on_error,
+            release,
+        )
+        with self._lock:
+            self._sessions[port] = session
+        self._post(("add", session))
+        return session
+
+    def remove_port(self, port: str):
+        """Stop servicing a port; returns once the I/O thread let go of it."""
+        with self._lock:
+            session = self._sessions.pop(port, None)
+        if not session:
+            return
+        done = Event()
+        self._post(("remove", session, done))
+        if not self._running:
+            self._apply_pending()
+        elif current_thread() is not self._thread:
+            done.wait(timeout=2)
+
+    def lines(self, port: str) -> list[tuple[float, str]]:
+        """Snapshot of the ring buffer for a single port."""
+        with self._lock:
+            session = self._sessions.get(port)
+            return list(session.lines) if session else []
+
+    def combined(
+        self, ports: list[str] | None = None, since: float | None = None
+    ) -> list[tuple[float, str, str]]:
+        """Timestamp-ordered (timestamp, port, text) view across ports."""
+        with self._lock:
+            snapshots = [
+                [(ts, port, text) for ts, text in session.lines]
+                for port, session in self._sessions.items()
+                if ports is None or port in ports
+            ]
+        merged = heapq.merge(*snapshots, key=lambda item: item[0])
+        if since is None:
+            return list(merged)
+        return [item for item in merged if item[0] >= since]
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        with self._lock:
+            return {
+                port: {"rx_bytes": s.rx_bytes, "rx_lines": s.rx_lines}
+                for port, s in self._sessions.items()
+            }
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = Thread(target=self._io_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self._apply_pending()
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            self._detach(session)
+        self._selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
+
+    def _post(self, op):
+        self._pending.append(op)
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            pass
+
+    def _apply_pending(self):
+        """Selector (un)registration only ever happens on the I/O thread."""
+        while self._pending:
+            op, session, *done = self._pending.popleft()
+            if op == "add":
+                try:
+                    self._selector.register(
+                        session.ser.fileno(), selectors.EVENT_READ, session
+                    )
+                except (AttributeError, OSError, ValueError):
+                    self._polled.append(session)
+            else:
+                self._detach(session)
+                done[0].set()
+
+    def _detach(self, session: PortSession):
+        try:
+            self._selector.unregister(session.ser.fileno())
+        except (AttributeError, KeyError, OSError, ValueError):
+            pass
+        if session in self._polled:
+            self._polled.remove(session)
+        session.close()
+
+    def _io_loop(self):
+        while self._running:
+            self._apply_pending()
+            timeout = MONITOR_POLL_INTERVAL_S if self._polled else None
+            for key, _ in self._selector.select(timeout):
+                if key.data is None:
+                    try:
+                        self._wake_r.recv(4096)
+                    except OSError:
+                        pass
+                    continue
+                self._service(key.data)
+            for session in list(self._polled):
+                self._service(session)
+
+    def _service(self, session: PortSession):
+        try:
+            n = session.ser.in_waiting
+            if not n and session in self._polled:
+                return
+            data = session.ser.read(n if n else 1)
+        except (OSError, serial.SerialException) as e:
+            self._emit(session.port, time.time(), f"RX error: {e}")
+            if session.on_error:
+                try:
+                    session.on_error(e)
+                except Exception:
+                    pass
+            with self._lock:
+                self._sessions.pop(session.port, None)
+            session.dead = True
+            self._detach(session)
+            return
+        if not data:
+            return
+        if session.on_data:
+            try:
+                session.on_data(data)
+            except Exception:
+                pass
+        ts = time.time()
+        with self._lock:
+            completed = session.feed(data, ts)
+        for line_ts, text in completed:
+            self._emit(session.port, line_ts, text)
+
+    def _emit(self, port: str, ts: float, text: str):
+        for callback in self._listeners:
+            try:
+                callback(port, ts, text)
+            except Exception:
+                pass
+
+
+def run_monitor(
+    ports: list[str],
+    baud: int = 115200,
+    capture_dir: str | None = None,
+):
+    """Headless monitor: print a combined, timestamped view until Ctrl+C."""
+    monitor = SerialMonitor()
+    width = max((len(p) for p in ports), default=0)
+    monitor.subscribe(
+        lambda port, ts, text: print(
+            f"{format_timestamp(ts)} {port:<{width}} | {text}"
+        )
+    )
+
+    if capture_dir:
+        os.makedirs(capture_dir, exist_ok=True)
+    for port in ports:
+        capture_path = (
+            os.path.join(capture_dir, f"{os.path.basename(port)}.log")
+            if capture_dir
+            else None
+        )
+        try:
+            monitor.add_port(port, baud=baud, capture_path=capture_path)
+            print(f"Monitoring {port} @ {baud}")
+        except (serial.SerialException, RuntimeError, ValueError) as e:
+            print(f"Could not open port {port}: {e}")
+
+    if not monitor.ports:
+        print("No ports to monitor")
+        monitor.stop()
+        return
+
+    monitor.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stats = monitor.stats()
+        monitor.stop()
+        for port, s in stats.items():
+            print(f"{port}: {s['rx_lines']} lines, {s['rx_bytes']} bytes")
+
+
+_monitor = None
+_monitor_lock = Lock()
+
+
+def get_serial_monitor() -> SerialMonitor:
+    """Process wide, started monitor (GUI terminal), stopped at exit."""
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = SerialMonitor()
+            _monitor.start()
+            atexit.register(_monitor.stop)
+        return _monitor
@@ -0,0 +1,220 @@
+"""GUI frame-time profiler and simulated RX/flash log load generator."""
+
+import time
+from collections import Counter
+from threading import Thread
+
+from kivy.clock import Clock
+
+from constants import PROFILE_FRAME_BUDGET_MS, PROFILE_TOP_CALLBACKS
+from util import percentile
+
+
+def _callback_name(callback) -> str:
+    return getattr(callback, "__qualname__", None) or repr(callback)
+
+
+class FrameProfiler:
+    """Record the time Kivy spends in each frame and the callbacks
+    scheduled with Clock.schedule_once per frame.
+
+    Frame time is the work between two Clock.idle() calls (events, input,
+    layout, drawing and the buffer flip), without the maxfps sleep, so it
+    is comparable to PROFILE_FRAME_BUDGET_MS. start() wraps
+    Clock.schedule_once and Clock.idle on the global Clock instance (so
+    every caller, including worker threads, is counted); stop() restores
+    the originals.
+    """
+
+    def __init__(self):
+        self.frame_times = []  # Seconds.
+        self.scheduled_per_frame = []
+        self.callbacks = Counter()  # Callback name -> times scheduled.
+        self.callbacks_max = Counter()  # Callback name -> most in a frame.
+        self._frame = Counter()
+        self._frame_start = None
+        self._schedule_once = None
+        self._idle = None
+
+    def start(self):
+        self._schedule_once = Clock.schedule_once
+        self._idle = Clock.idle
+
+        def _counting_schedule_once(callback, timeout=0):
+            self._frame[_callback_name(callback)] += 1
+            return self._schedule_once(callback, timeout)
+
+        def _timed_idle():
+            self._on_frame_end()
+            current = self._idle()
+            self._frame_start = time.perf_counter()
+            return current
+
+        Clock.schedule_once = _counting_schedule_once
+        Clock.idle = _timed_idle
+
+    def stop(self):
+        if self._schedule_once:
+            Clock.schedule_once = self._schedule_once
+            self._schedule_once = None
+        if self._idle:
+            Clock.idle = self._idle
+            self._idle = None
+
+    def _on_frame_end(self):
+        if self._frame_start is None:
+            return
+        self.frame_times.append(time.perf_counter() - self._frame_start)
+        frame, self._frame = self._frame, Counter()
+        self.scheduled_per_frame.append(sum(frame.values()))
+        self.callbacks.update(frame)
+        for name, count in frame.items():
+            self.callbacks_max[name] = max(self.callbacks_max[name], count)
+
+    def summary(self) -> dict:
+        # The first frame includes window and widget setup, skip it.
+        frames_ms = [dt * 1000 for dt in self.frame_times[1:]]
+        if not frames_ms:
+            return {"frames": 0}
+        return {
+            "frames": len(frames_ms),
+            "p50_ms": percentile(frames_ms, 50),
+            "p90_ms": percentile(frames_ms, 90),
+            "p99_ms": percentile(frames_ms, 99),
+            "max_ms": max(frames_ms),
+            "over_budget": sum(
+                ms > PROFILE_FRAME_BUDGET_MS for ms in frames_ms
+            ),
+            "scheduled_mean": sum(self.scheduled_per_frame)
+            / len(self.scheduled_per_frame),
+            "scheduled_max": max(self.scheduled_per_frame),
+            "callbacks": [
+                (name, count, self.callbacks_max[name])
+                for name, count in self.callbacks.most_common(
+                    PROFILE_TOP_CALLBACKS
+                )
+            ],
+        }
+
+    def report(self) -> str:
+        s = self.summary()
+        if not s["frames"]:
+            return "No frames recorded"
+        lines = [
+            f"Frames: {s['frames']} "
+            f"({s['over_budget']} over {PROFILE_FRAME_BUDGET_MS:.1f} ms)",
+            f"\tFrame time (ms): p50 {s['p50_ms']:.2f}  "
+            f"p90 {s['p90_ms']:.2f}  p99 {s['p99_ms']:.2f}  "
+            f"max {s['max_ms']:.2f}",
+            f"\tCallbacks scheduled per frame: "
+            f"mean {s['scheduled_mean']:.1f}  max {s['scheduled_max']}",
+        ]
+        if s["callbacks"]:
+            lines.append("\tMost scheduled callbacks (total, max per frame):")
+            lines += [
+                f"\t\t{count:>8} {most:>5}  {name}"
+                for name, count, most in s["callbacks"]
+            ]
+        return "\n".join(lines)
+
+
+class LoadGenerator:
+    """Flood the terminal RX and flash log paths without any hardware.
+
+    RX lines go through TerminalUI._handle_rx from a worker thread, as the
+    serial monitor I/O thread does; flash log lines are scheduled the same
+    way as the flash worker thread does.
+    """
+
+    def __init__(self, root_ui, rx_rate: float = 1000, log_rate: float = 50):
+        self.root_ui = root_ui
+        self.rx_rate = rx_rate  # Lines per second.
+        self.log_rate = log_rate  # Lines per second.
+        self.rx_lines = 0
+        self.log_lines = 0
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _run(self):
+        term_ui = self.root_ui.term_ui
+        flash_ui = self.root_ui.flash_ui
+        start = time.perf_counter()
+        while self._running:
+            time.sleep(0.01)
+            elapsed = time.perf_counter() - start
+
+            rx_due = int(elapsed * self.rx_rate) - self.rx_lines
+            if rx_due > 0:
+                term_ui._handle_rx(
+                    b"".join(
+                        f"[{self.rx_lines + i:08d}] INFO simulated rx "
+                        f"line\r\n".encode()
+                        for i in range(rx_due)
+                    )
+                )
+                self.rx_lines += rx_due
+
+            for _ in range(int(elapsed * self.log_rate) - self.log_lines):
+                self.log_lines += 1
+                Clock.schedule_once(
+                    lambda dt, n=self.log_lines: flash_ui.log(
+                        f"Simulated flash log line {n}"
+                    )
+                )
+
+
+def run_profile(
+    duration_s: float = 10,
+    rx_rate: float = 1000,
+    log_rate: float = 50,
+    max_p99_ms: float | None = None,
+) -> int:
+    """Run the GUI under simulated load and print frame-time percentiles.
+
+    Returns a process exit code: 1 if max_p99_ms is given and exceeded.
+    """
+    from gui import PyBlasherApp
+
+    profiler = FrameProfiler()
+    load = None
+
+    class _ProfiledApp(PyBlasherApp):
+        def on_start(self):
+            nonlocal load
+            if rx_rate:
+                self.root_ui._go("term")
+            load = LoadGenerator(self.root_ui, rx_rate, log_rate)
+            profiler.start()
+            load.start()
+            Clock.schedule_once(lambda dt: self.stop(), duration_s)
+
+    _ProfiledApp().run()
+    if load:
+        load.stop()
+    profiler.stop()
+
+    print(
+        f"Simulated load: {rx_rate:g} RX lines/s, {log_rate:g} flash log "
+        f"lines/s for {duration_s:g} s"
+        + (f" ({load.rx_lines} RX, {load.log_lines} log)" if load else "")
+    )
+    print(profiler.report())
+
+    summary = profiler.summary()
+    if max_p99_ms is not None and (
+        not summary["frames"] or summary["p99_ms"] > max_p99_ms
+    ):
+        print(f"\tFAIL: frame time p99 above {max_p99_ms:g} ms")
+        return 1
+    return 0
@@ -0,0 +1,493 @@
+"""Local flash server (HTTP/Unix socket API, job queue, worker per port)."""
+
+import hashlib
+import json
+import os
+import re
+import socketserver
+import stat
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Condition, Lock, Thread, current_thread
+
+from boot_monitor import monitor_boot
+from constants import (
+    SERVER_IMAGE_DIR,
+    SERVER_MAX_IMAGE_BYTES,
+    SERVER_PROGRESS_BYTES,
+    SERVER_RESCAN_INTERVAL_S,
+)
+from flash_firmware import flash_image
+from history import FlashRecord, get_history
+from session_pool import get_session_pool
+from util import find_cp2102n_ports
+
+ANY_PORT = "any"
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class ImageStore:
+    """Uploaded images stored once per SHA-256 in a directory."""
+
+    def __init__(self, directory: str = SERVER_IMAGE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.directory, f"{sha256}.bin")
+
+    def put(self, data: bytes) -> tuple[str, bool]:
+        """Store an image, return (sha256, True if it was not stored yet)."""
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self.path(sha256)
+        if os.path.exists(path):
+            return sha256, False
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return sha256, True
+
+    def exists(self, sha256: str) -> bool:
+        return bool(re.fullmatch(r"[0-9a-f]{64}", sha256)) and os.path.exists(
+            self.path(sha256)
+        )
+
+
+class FlashJob:
+    """A queued flash request and its progress event stream."""
+
+    def __init__(
+        self,
+        job_id: str,
+        image: str,
+        port: str = ANY_PORT,
+        base_addr: int = 0x08000000,
+        boot_banner: str | None = None,
+    ):
+        self.id = job_id
+        self.image = image
+        self.port = port
+        self.base_addr = base_addr
+        self.boot_banner = boot_banner
+        self.state = JOB_QUEUED
+        self.assigned_port = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.events = []
+        self._cond = Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.state in (JOB_DONE, JOB_FAILED)
+
+    def emit(self, event: str, **fields):
+        """Append an event; JOB_DONE/JOB_FAILED also set the final state, so
+        streamers never see a finished job without its last event."""
+        with self._cond:
+            if event in (JOB_DONE, JOB_FAILED):
+                self.state = event
+            self.events.append(
+                {"event": event, "time": time.time(), "job": self.id, **fields}
+            )
+            self._cond.notify_all()
+
+    def wait_events(self, start: int, timeout: float = 1.0) -> list[dict]:
+        """Events from index start on, waiting for new ones if none yet."""
+        with self._cond:
+            if len(self.events) <= start and not self.finished:
+                self._cond.wait(timeout)
+            return self.events[start:]
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "image": self.image,
+            "port": self.port,
+            "base_addr": f"0x{self.base_addr:08X}",
+            "boot_banner": self.boot_banner,
+            "state": self.state,
+            "assigned_port": self.assigned_port,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+        }
+
+
+class FlashServer:
+    """Job queue serviced by one worker thread per flashing port.
+
+    Jobs name a port or ANY_PORT; each worker takes the oldest queued job
+    it can run. Workers are added as CP2102N ports appear and retired when
+    they disappear (ports passed in explicitly are kept).
+    """
+
+    def __init__(
+        self,
+        images: ImageStore,
+        ports: list[str] | None = None,
+        scan: bool = True,
+    ):
+        self.images = images
+        self.scan = scan
+        self._jobs = {}
+        self._queue = []
+        self._workers = {}
+        self._scanned = set()  # Ports added by rescan().
+        self._next_id = 1
+        self._lock = Lock()
+        self._work = Condition(self._lock)
+        self._running = True
+        for port in ports or []:
+            self.add_port(port)
+        if scan:
+            self.rescan()
+            Thread(target=self._rescan_loop, daemon=True).start()
+
+    @property
+    def ports(self) -> list[str]:
+        with self._lock:
+            return list(self._workers)
+
+    def add_port(self, port: str, scanned: bool = False):
+        with self._lock:
+            if scanned:
+                self._scanned.add(port)
+            if port in self._workers:
+                return
+            worker = Thread(target=self._worker_loop, args=(port,), daemon=True)
+            self._workers[port] = worker
+        worker.start()
+
+    def remove_port(self, port: str):
+        """Retire a port's worker (after its running job) and fail the jobs
+        queued for that port only."""
+        with self._lock:
+            self._scanned.discard(port)
+            if self._workers.pop(port, None) is None:
+                return
+            orphaned = [job for job in self._queue if job.port == port]
+            for job in orphaned:
+                self._queue.remove(job)
+            self._work.notify_all()
+        for job in orphaned:
+            job.error = f"Port {port} was removed"
+            job.emit(JOB_FAILED, error=job.error)
+
+    def rescan(self):
+        found = set(find_cp2102n_ports())
+        for port in found:
+            self.add_port(port, scanned=True)
+        with self._lock:
+            gone = self._scanned - found
+        for port in gone:
+            self.remove_port(port)
+
+    def submit(
+        self,
+        image: str,
+        port: str = ANY_PORT,
+        base_addr: int = 0x08000000,
+        boot_banner: str | None = None,
+    ) -> FlashJob:
+        if not self.images.exists(image):
+            raise ValueError(f"Unknown image {image!r}, upload it first")
+        if boot_banner:
+            re.compile(boot_banner)
+        with self._lock:
+            if port != ANY_PORT and port not in self._workers:
+                raise ValueError(f"Unknown port {port!r}")
+            job = FlashJob(
+                str(self._next_id), image, port, base_addr, boot_banner
+            )
+            self._next_id += 1
+            self._jobs[job.id] = job
+            # Queued before a worker can see it, so it is always event 0.
+            job.emit(JOB_QUEUED)
+            self._queue.append(job)
+            self._work.notify_all()
+        return job
+
+    def job(self, job_id: str) -> FlashJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> list[FlashJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def port_status(self) -> list[dict]:
+        with self._lock:
+            busy = {
+                job.assigned_port
+                for job in self._jobs.values()
+                if job.state == JOB_RUNNING
+            }
+            return [
+                {
+                    "port": port,
+                    "busy": port in busy,
+                    "queued": sum(job.port == port for job in self._queue),
+                }
+                for port in self._workers
+            ]
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+            self._work.notify_all()
+
+    def _next_job(self, port: str) -> FlashJob | None:
+        """Next job for port, None once stopped or the worker is retired."""
+        with self._lock:
+            while self._running and self._workers.get(port) is current_thread():
+                for job in self._queue:
+                    if job.port in (port, ANY_PORT):
+                        self._queue.remove(job)
+                        job.state = JOB_RUNNING
+                        job.assigned_port = port
+                        return job
+                self._work.wait()
+        return None
+
+    def _worker_loop(self, port: str):
+        while True:
+            job = self._next_job(port)
+            if job is None:
+                return
+            self._run_job(job, port)
+
+    def _run_job(self, job: FlashJob, port: str):
+        job.emit(JOB_RUNNING, port=port)
+        image_path = self.images.path(job.image)
+        record = FlashRecord(port, image_path)
+        last_reported = [-SERVER_PROGRESS_BYTES]
+
+        def _progress(phase, done, total):
+            if phase != "write" or done == 0:
+                job.emit("phase", name=phase, total=total)
+            elif done - last_reported[0] >= SERVER_PROGRESS_BYTES or (
+                done == total
+            ):
+                last_reported[0] = done
+                job.emit("progress", done=done, total=total)
+
+        try:
+            with get_session_pool().lease(
+                port, owner=f"flash server job {job.id}", wait=5
+            ) as session:
+                try:
+                    sync = flash_image(
+                        session.ser,
+                        image_path,
+                        base_addr=job.base_addr,
+                        phases=record.phases,
+                        device=record.usb_serial or port,
+                        synced=session.synced,
+                        progress=_progress,
+                    )
+                finally:
+                    session.synced = False
+                record.retries = sync.retries
+                result = {
+                    "time_to_bootloader_s": sync.time_to_bootloader_s,
+                    "sync_attempts": sync.attempts,
+                }
+                if job.boot_banner is not None:
+                    report = monitor_boot(
+                        session.ser,
+                        sync.go_acked_at,
+                        banner_regex=job.boot_banner or None,
+                    )
+                    report.add_phases(record.phases)
+                    result["boot_first_byte_s"] = report.first_byte_s
+                    result["boot_banner_s"] = report.banner_s
+            record.finish()
+            job.emit(JOB_DONE, phases=record.phases, **result)
+        except Exception as e:
+            record.finish(e)
+            job.error = str(e)
+            job.emit(JOB_FAILED, error=str(e))
+        finally:
+            get_history().submit(record)
+
+    def _rescan_loop(self):
+        while self._running:
+            time.sleep(SERVER_RESCAN_INTERVAL_S)
+            try:
+                self.rescan()
+            except Exception:
+                pass
+
+
+class FlashRequestHandler(BaseHTTPRequestHandler):
+    """JSON API, see the README for the endpoints."""
+
+    server_version = "PyBlasher"
+    flash_server = None  # Set by make_handler().
+
+    def address_string(self) -> str:
+        # Unix socket peers have no (host, port) address.
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} - {format % args}")
+
+    def _send_json(self, status: int, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length", 0))
+        if length > SERVER_MAX_IMAGE_BYTES:
+            raise ValueError("Request body too large")
+        return self.rfile.read(length)
+
+    def do_GET(self):
+        server = self.flash_server
+        parts = self.path.strip("/").split("/")
+        if parts == ["ports"]:
+            self._send_json(200, server.port_status())
+        elif parts == ["jobs"]:
+            self._send_json(200, [job.to_dict() for job in server.jobs()])
+        elif len(parts) in (2, 3) and parts[0] == "jobs":
+            job = server.job(parts[1])
+            if job is None:
+                self._send_json(404, {"error": "Unknown job"})
+            elif len(parts) == 2:
+                self._send_json(200, job.to_dict())
+            elif parts[2] == "events":
+                self._stream_events(job)
+            else:
+                self._send_json(404, {"error": "Not found"})
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        server = self.flash_server
+        try:
+            body = self._read_body()
+            if self.path == "/images":
+                sha256, new = server.images.put(body)
+                self._send_json(
+                    201 if new else 200,
+                    {"sha256": sha256, "size": len(body), "new": new},
+                )
+            elif self.path == "/jobs":
+                request = json.loads(body or b"{}")
+                if not isinstance(request, dict):
+                    raise ValueError("Job request must be a JSON object")
+                job = server.submit(**_job_fields(request))
+                self._send_json(201, job.to_dict())
+            else:
+                self._send_json(404, {"error": "Not found"})
+        except KeyError as e:
+            self._send_json(400, {"error": f"Missing field {e}"})
+        except (ValueError, re.error) as e:
+            self._send_json(400, {"error": str(e)})
+
+    def _stream_events(self, job: FlashJob):
+        """Newline delimited JSON events until the job finishes."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        sent = 0
+        while True:
+            finished = job.finished
+            events = job.wait_events(sent)
+            for event in events:
+                self.wfile.write(json.dumps(event).encode() + b"\n")
+            self.wfile.flush()
+            sent += len(events)
+            if finished and not events:
+                return
+
+
+def _job_fields(request: dict) -> dict:
+    """Type checked submit() arguments from a POST /jobs body."""
+    fields = {
+        "image": request["image"],
+        "port": request.get("port", ANY_PORT),
+        "boot_banner": request.get("boot_banner"),
+    }
+    for name, value in fields.items():
+        if not isinstance(value, str) and not (
+            name == "boot_banner" and value is None
+        ):
+            raise ValueError(f"{name} must be a string")
+    base_addr = request.get("base_addr", 0x08000000)
+    if isinstance(base_addr, str):
+        base_addr = int(base_addr, 0)
+    elif not isinstance(base_addr, int) or isinstance(base_addr, bool):
+        raise ValueError("base_addr must be an integer or a string")
+    if not 0 <= base_addr < 1 << 32:
+        raise ValueError(f"base_addr 0x{base_addr:X} is out of range")
+    fields["base_addr"] = base_addr
+    return fields
+
+
+def make_handler(flash_server: FlashServer):
+    return type(
+        "BoundFlashRequestHandler",
+        (FlashRequestHandler,),
+        {"flash_server": flash_server},
+    )
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+
+    class ThreadingUnixHTTPServer(
+        socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+    ):
+        daemon_threads = True
+
+
+def run_server(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    unix_path: str | None = None,
+    image_dir: str = SERVER_IMAGE_DIR,
+    simulate: int = 0,
+) -> int:
+    """Serve the flash API until Ctrl+C."""
+    if unix_path:
+        if not hasattr(socketserver, "UnixStreamServer"):
+            print("Unix sockets are not supported on this platform")
+            return 1
+        if os.path.lexists(unix_path):
+            if not stat.S_ISSOCK(os.lstat(unix_path).st_mode):
+                print(
+                    f"{unix_path} exists and is not a socket, not removing it"
+                )
+                return 1
+            os.unlink(unix_path)  # Stale socket from an earlier run.
+
+    ports = [f"sim://{i}" for i in range(simulate)]
+    flash_server = FlashServer(ImageStore(image_dir), ports)
+    handler = make_handler(flash_server)
+
+    if unix_path:
+        httpd = ThreadingUnixHTTPServer(unix_path, handler)
+        print(f"PyBlasher flash server on unix:{unix_path}")
+    else:
+        httpd = ThreadingHTTPServer((host, port), handler)
+        print(f"PyBlasher flash server on http://{host}:{port}")
+    print(f"\tPorts: {', '.join(flash_server.ports) or 'none yet'}")
+
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        flash_server.stop()
+        httpd.server_close()
+        if unix_path and os.path.exists(unix_path):
+            os.unlink(unix_path)
+    return 0
@@ -0,0 +1,233 @@
+"""Persistent serial session pool (one warm handle per port)."""
+
+import atexit
+import time
+from contextlib import contextmanager
+from threading import Lock, Thread
+
+import serial
+
+from bootloader_sim import is_simulated, open_simulated_port
+from constants import (
+    POOL_HEALTH_INTERVAL_S,
+    POOL_HEALTH_WAIT_S,
+    POOL_IDLE_TIMEOUT_S,
+    POOL_WRITE_TIMEOUT_S,
+)
+from flash_firmware import SyncResult, ensure_synced, probe_bootloader
+
+HEALTH_CHECK_OWNER = "health check"
+
+
+def open_pooled_port(
+    port: str, baud: int, parity: str, timeout: float
+) -> serial.Serial:
+    if is_simulated(port):
+        return open_simulated_port(port)
+    return serial.Serial(
+        port,
+        baud,
+        parity=parity,
+        timeout=timeout,
+        write_timeout=POOL_WRITE_TIMEOUT_S,
+    )
+
+
+class SerialSession:
+    """A pooled port handle plus the state worth keeping between users."""
+
+    def __init__(self, port: str, ser: serial.Serial):
+        self.port = port
+        self.ser = ser
+        self.synced = False  # Bootloader auto-baud done and not left yet.
+        self.owner = None
+        self.last_used = time.monotonic()
+        self.closed = False
+        self._lock = Lock()
+
+    def configure(self, baud: int, parity: str, timeout: float):
+        """Apply framing on the open handle, only touching what changed."""
+        if self.ser.baudrate != baud or self.ser.parity != parity:
+            self.ser.baudrate = baud
+            self.ser.parity = parity
+            self.synced = False
+        self.ser.timeout = timeout
+
+    def ensure_bootloader(self, device: str | None = None) -> SyncResult:
+        """Sync the bootloader unless this session already is."""
+        result = ensure_synced(self.ser, device or self.port, self.synced)
+        self.synced = True
+        return result
+
+    def close(self):
+        self.closed = True
+        self.synced = False
+        try:
+            self.ser.close()
+        except Exception:
+            pass
+
+
+class SessionPool:
+    """Own one serial handle per port and lease it exclusively.
+
+    Flash, verify, dump and the UART terminal all lease sessions from the
+    pool, so back-to-back operations on a board reuse the open handle, the
+    configured baud/parity and a synced bootloader instead of reopening
+    and re-syncing. Idle sessions are health checked in the background and
+    closed if the device is gone or after POOL_IDLE_TIMEOUT_S.
+    """
+
+    def __init__(self, opener=open_pooled_port):
+        self._opener = opener
+        self._sessions = {}
+        self._lock = Lock()
+        self._running = True
+        self._thread = Thread(target=self._health_loop, daemon=True)
+        self._thread.start()
+
+    def acquire(
+        self,
+        port: str,
+        baud: int = 115200,
+        parity: str = serial.PARITY_EVEN,
+        timeout: float = 1,
+        owner: str = "",
+        wait: float = 0,
+    ) -> SerialSession:
+        """Lease a port's session, opening it if needed.
+
+        Raises RuntimeError if another owner holds the port for longer than
+        wait seconds. A background health check is always waited out (up
+        to POOL_HEALTH_WAIT_S). Pair with release(), or use lease().
+        """
+        deadline = time.monotonic() + wait
+        while True:
+            with self._lock:
+                session = self._sessions.get(port)
+            if session is not None and session.closed:
+                self.discard(session)  # Dead handle, reopen.
+                session = None
+            if session is None:
+                session = self._open(port, baud, parity, timeout)
+            if not session._lock.acquire(
+                timeout=max(0.0, deadline - time.monotonic())
+            ) and (
+                session.owner != HEALTH_CHECK_OWNER
+                or not session._lock.acquire(timeout=POOL_HEALTH_WAIT_S)
+            ):
+                raise RuntimeError(f"Port {port} is in use by {session.owner}")
+            if not session.closed:
+                break
+            session._lock.release()  # Closed while we waited, reopen.
+            self.discard(session)
+
+        try:
+            session.configure(baud, parity, timeout)
+        except Exception:
+            session._lock.release()
+            self.close(port)
+            raise
+        session.owner = owner or "another user"
+        return session
+
+    def release(self, session: SerialSession):
+        session.owner = None
+        session.last_used = time.monotonic()
+        session._lock.release()
+
+    @contextmanager
+    def lease(self, port: str, **kwargs):
+        session = self.acquire(port, **kwargs)
+        try:
+            yield session
+        except (OSError, serial.SerialException):
+            # The handle is likely dead, do not hand it out again.
+            self.discard(session)
+            raise
+        finally:
+            self.release(session)
+
+    def close(self, port: str):
+        with self._lock:
+            session = self._sessions.pop(port, None)
+        if session:
+            session.close()
+
+    def discard(self, session: SerialSession):
+        """Drop a session from the pool (if still current) and close it.
+
+        For dead handles; a leased session must still be release()d.
+        """
+        with self._lock:
+            if self._sessions.get(session.port) is session:
+                del self._sessions[session.port]
+        session.close()
+
+    def close_all(self):
+        self._running = False
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+    def _open(
+        self, port: str, baud: int, parity: str, timeout: float
+    ) -> SerialSession:
+        ser = self._opener(port, baud, parity, timeout)
+        with self._lock:
+            existing = self._sessions.get(port)
+            if existing and not existing.closed:
+                # Lost an open race, keep the first handle.
+                ser.close()
+                return existing
+            session = SerialSession(port, ser)
+            self._sessions[port] = session
+            return session
+
+    def health_check(self):
+        """Check idle sessions and close dead or long unused ones."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            if not session._lock.acquire(blocking=False):
+                continue  # Leased, the owner will notice problems itself.
+            session.owner = HEALTH_CHECK_OWNER
+            try:
+                if session.closed:
+                    healthy = False
+                elif time.monotonic() - session.last_used > POOL_IDLE_TIMEOUT_S:
+                    healthy = False
+                else:
+                    session.ser.in_waiting  # Raises once the device is gone.
+                    healthy = session.ser.is_open
+                    if healthy and session.synced:
+                        session.synced = probe_bootloader(session.ser)
+            except Exception:
+                healthy = False
+            finally:
+                session.owner = None
+                session._lock.release()
+            if not healthy:
+                self.discard(session)
+
+    def _health_loop(self):
+        while self._running:
+            time.sleep(POOL_HEALTH_INTERVAL_S)
+            if self._running:
+                self.health_check()
+
+
+_pool = None
+_pool_lock = Lock()
+
+
+def get_session_pool() -> SessionPool:
+    """Process wide session pool, closed at interpreter exit."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SessionPool()
+            atexit.register(_pool.close_all)
+        return _pool
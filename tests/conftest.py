@@ -0,0 +1,31 @@
+"""Shared fixtures: fresh simulated devices and no writes under ~/.pyblasher."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bootloader_sim  # noqa: E402
+import flash_firmware  # noqa: E402
+import history  # noqa: E402
+import session_pool  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    """Fresh sim devices, session pool, sync timings and history database."""
+    monkeypatch.setattr(bootloader_sim, "_devices", {})
+    monkeypatch.setattr(
+        flash_firmware,
+        "_sync_timings",
+        flash_firmware.SyncTimings(str(tmp_path / "sync_timings.json")),
+    )
+    writer = history.HistoryWriter(str(tmp_path / "history.db"))
+    monkeypatch.setattr(history, "_writer", writer)
+    pool = session_pool.SessionPool()
+    monkeypatch.setattr(session_pool, "_pool", pool)
+    yield
+    pool.close_all()
+    writer.close()
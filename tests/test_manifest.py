@@ -0,0 +1,93 @@
+"""Manifest validation and erase plans against a simulated bootloader."""
+
+import json
+import os
+
+import pytest
+
+from bootloader_sim import SimulatedBootloader
+from constants import SIM_FLASH_BASE, SIM_PAGE_SIZE
+from manifest import Manifest, flash_manifest
+
+
+def write_manifest(tmp_path, images: dict[str, bytes], spec: dict) -> str:
+    for name, data in images.items():
+        (tmp_path / name).write_bytes(data)
+    path = tmp_path / "manifest.json"
+    path.write_text(json.dumps(spec))
+    return str(path)
+
+
+def test_overlapping_images_are_rejected(tmp_path):
+    path = write_manifest(
+        tmp_path,
+        {"boot.bin": b"\x01" * 0x5000, "app.bin": b"\x02" * 0x100},
+        {
+            "images": [
+                {"path": "boot.bin", "base_addr": "0x08000000"},
+                {"path": "app.bin", "base_addr": "0x08004000"},
+            ]
+        },
+    )
+    with pytest.raises(ValueError, match="overlaps"):
+        Manifest.load(path)
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        [1],
+        {"images": ["boot.bin"]},
+        {"images": {"path": "boot.bin"}},
+        {"flash": 4096, "images": []},
+        {"images": [{"path": 1, "base_addr": 0}]},
+        {"images": [{"path": "boot.bin", "base_addr": 1.5}]},
+        {"images": [{"path": "boot.bin"}]},
+    ],
+)
+def test_malformed_manifests_raise_value_error(tmp_path, spec):
+    path = write_manifest(tmp_path, {"boot.bin": b"\x01" * 16}, spec)
+    with pytest.raises(ValueError):
+        Manifest.load(path)
+
+
+def test_erase_plan_matches_flash(tmp_path):
+    boot = os.urandom(SIM_PAGE_SIZE + 100)  # Pages 0-1.
+    app = os.urandom(3 * SIM_PAGE_SIZE)  # Pages 4-6.
+    cal = os.urandom(64)  # Already erased page 9, not in the plan.
+    path = write_manifest(
+        tmp_path,
+        {"boot.bin": boot, "app.bin": app, "cal.bin": cal},
+        {
+            "images": [
+                {"path": "boot.bin", "base_addr": SIM_FLASH_BASE},
+                {
+                    "path": "app.bin",
+                    "base_addr": hex(SIM_FLASH_BASE + 4 * SIM_PAGE_SIZE),
+                },
+                {
+                    "path": "cal.bin",
+                    "base_addr": hex(SIM_FLASH_BASE + 9 * SIM_PAGE_SIZE),
+                    "erase": "none",
+                },
+            ],
+        },
+    )
+    manifest = Manifest.load(path)
+    assert manifest.erase_plan() == [0, 1, 4, 5, 6]
+
+    device = SimulatedBootloader("sim://manifest")
+    device.flash[:] = b"\x5a" * len(device.flash)  # Old contents everywhere.
+    page = SIM_PAGE_SIZE
+    device.flash[9 * page : 10 * page] = b"\xff" * page
+    sync = flash_manifest(device, manifest, synced=False)
+    assert sync.go_acked_at is not None
+    assert device.go_addr == SIM_FLASH_BASE
+
+    expected = bytearray(b"\x5a" * len(device.flash))
+    for number in manifest.erase_plan() + [9]:
+        expected[number * page : (number + 1) * page] = b"\xff" * page
+    for entry in manifest.entries:
+        start = entry.base_addr - SIM_FLASH_BASE
+        expected[start : start + len(entry.data)] = entry.data
+    assert device.flash == expected
@@ -0,0 +1,129 @@
+"""Flash server end to end over HTTP against simulated bootloaders."""
+
+import http.client
+import json
+import os
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import bootloader_sim
+from constants import SIM_FLASH_BASE
+from server import FlashServer, ImageStore, make_handler
+
+
+@pytest.fixture
+def api(tmp_path):
+    flash_server = FlashServer(
+        ImageStore(str(tmp_path / "images")),
+        ["sim://0", "sim://1"],
+        scan=False,
+    )
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(flash_server))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    def request(method: str, path: str, body: bytes | None = None):
+        conn = http.client.HTTPConnection(*httpd.server_address, timeout=30)
+        try:
+            conn.request(method, path, body)
+            response = conn.getresponse()
+            return response.status, response.read()
+        finally:
+            conn.close()
+
+    request.flash_server = flash_server
+    yield request
+    flash_server.stop()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def post_json(api, path: str, body) -> tuple[int, dict]:
+    status, data = api("POST", path, json.dumps(body).encode())
+    return status, json.loads(data)
+
+
+def test_upload_is_deduplicated(api):
+    image = os.urandom(3000)
+    status, data = api("POST", "/images", image)
+    first = json.loads(data)
+    assert status == 201 and first["new"] and first["size"] == len(image)
+    status, data = api("POST", "/images", image)
+    again = json.loads(data)
+    assert status == 200 and not again["new"]
+    assert again["sha256"] == first["sha256"]
+
+
+def test_jobs_flash_both_ports(api):
+    images = [os.urandom(5000), os.urandom(9000)]
+    shas = [json.loads(api("POST", "/images", i)[1])["sha256"] for i in images]
+
+    # Jobs pinned to a port run in order, so the last one per port is what
+    # stays in flash (every job mass erases).
+    requests = [
+        {"image": shas[0], "port": "sim://0"},
+        {"image": shas[1], "port": "sim://1", "base_addr": "0x08004000"},
+        {
+            "image": shas[1],
+            "port": "sim://0",
+            "base_addr": SIM_FLASH_BASE + 0x10000,
+            "boot_banner": "simulated app ready",
+        },
+        {"image": shas[0], "port": "sim://1", "base_addr": "0x08020000"},
+    ]
+    jobs = []
+    for body in requests:
+        status, job = post_json(api, "/jobs", body)
+        assert status == 201, job
+        jobs.append(job)
+
+    for body, job in zip(requests, jobs):
+        status, data = api("GET", f"/jobs/{job['id']}/events")
+        assert status == 200
+        events = [json.loads(line) for line in data.splitlines()]
+        names = [e["event"] for e in events]
+        assert names[:2] == ["queued", "running"], events
+        assert names[-1] == "done", events
+        assert events[1]["port"] == body["port"]
+        progress = [e for e in events if e["event"] == "progress"]
+        assert progress[-1]["done"] == progress[-1]["total"]
+        if "boot_banner" in body:
+            assert events[-1]["boot_banner_s"] is not None
+
+    status, data = api("GET", "/jobs")
+    assert {j["state"] for j in json.loads(data)} == {"done"}
+
+    for port, image, base_addr in (
+        ("sim://0", images[1], SIM_FLASH_BASE + 0x10000),
+        ("sim://1", images[0], 0x08020000),
+    ):
+        device = bootloader_sim._devices[port]
+        start = base_addr - device.flash_base
+        end = start + len(image)
+        assert device.flash[start:end] == image
+        assert device.flash[:start] == b"\xff" * start
+        assert device.flash[end:] == b"\xff" * (len(device.flash) - end)
+        assert device.go_addr == base_addr
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        [1],
+        {},
+        {"image": 5},
+        {"image": "0" * 64},
+        {"image": "IMAGE", "base_addr": 1.5},
+        {"image": "IMAGE", "port": 3},
+        {"image": "IMAGE", "port": "sim://9"},
+        {"image": "IMAGE", "boot_banner": ["x"]},
+    ],
+)
+def test_bad_job_requests_queue_nothing(api, body):
+    sha256 = json.loads(api("POST", "/images", b"\x00" * 64)[1])["sha256"]
+    if isinstance(body, dict) and body.get("image") == "IMAGE":
+        body = {**body, "image": sha256}
+    status, error = post_json(api, "/jobs", body)
+    assert status == 400 and error["error"]
+    assert api.flash_server.jobs() == []
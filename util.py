@@ -2,6 +2,7 @@
 
 import os.path
 import sys
+import time
 
 import serial
 from serial.tools import list_ports
@@ -62,28 +63,30 @@ def find_cp2102n_ports() -> list[str]:
     return matches
 
 
-def open_serial_port(
-    port: str,
-    baud: int = 115200,
-    timeout: float = 0.2,
-    write_timeout: float = 0.5,
-) -> serial.Serial:
-    """Open a serial port with sane defaults and clean buffers."""
-    ser = serial.Serial(
-        port=port,
-        baudrate=baud,
-        timeout=timeout,
-        write_timeout=write_timeout,
-        rtscts=False,
-        dsrdtr=False,
-    )
-    ser.dtr = False
-    ser.rts = False
-    ser.reset_input_buffer()
-    ser.reset_output_buffer()
-    return ser
+def get_usb_serial(port: str) -> str | None:
+    """Return the USB serial number of the device behind a port, if any."""
+    for info in list_ports.comports():
+        if info.device == port:
+            return info.serial_number
+    return None
 
 
 def write_serial_bytes(ser: serial.Serial, data: bytes) -> None:
     ser.write(data)
     ser.flush()
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Linearly interpolated percentile (pct in 0-100) of unsorted values."""
+    if not values:
+        raise ValueError("percentile of empty data")
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def format_timestamp(ts: float) -> str:
+    """Wall clock HH:MM:SS.mmm of an epoch timestamp."""
+    return f"{time.strftime('%H:%M:%S', time.localtime(ts))}.{int(ts % 1 * 1000):03d}"